@@ -0,0 +1,212 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+def normalize_query(query: str) -> str:
+    """Normaliza la consulta para que variantes triviales compartan entrada"""
+    return re.sub(r'\s+', ' ', query.lower()).strip()
+
+
+def cache_key(query: str) -> str:
+    """Clave del caché: hash de la consulta normalizada"""
+    return hashlib.sha1(normalize_query(query).encode("utf-8")).hexdigest()
+
+
+class LRUPolicy:
+    """Expulsa la entrada usada hace más tiempo"""
+
+    def __init__(self):
+        self.order = OrderedDict()
+
+    def on_insert(self, key):
+        self.order[key] = None
+
+    def on_access(self, key):
+        self.order.move_to_end(key)
+
+    def on_remove(self, key):
+        self.order.pop(key, None)
+
+    def victim(self):
+        return next(iter(self.order))
+
+
+class FIFOPolicy(LRUPolicy):
+    """Expulsa la entrada insertada hace más tiempo, sin importar los accesos"""
+
+    def on_access(self, key):
+        pass
+
+
+class TTLPolicy(FIFOPolicy):
+    """
+    Las entradas vencen ttl segundos después de insertarse (lo revisa el
+    caché); si falta espacio se expulsa la más próxima a vencer.
+    """
+
+
+class LFUPolicy:
+    """Expulsa la entrada con menos accesos (empates: la menos reciente), en O(1)"""
+
+    def __init__(self):
+        self.freq = {}
+        self.buckets = {}  # frecuencia -> OrderedDict de claves
+        self.min_freq = 0
+
+    def on_insert(self, key):
+        self.freq[key] = 1
+        self.buckets.setdefault(1, OrderedDict())[key] = None
+        self.min_freq = 1
+
+    def on_access(self, key):
+        count = self.freq[key]
+        bucket = self.buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[count]
+            if self.min_freq == count:
+                self.min_freq = count + 1
+        self.freq[key] = count + 1
+        self.buckets.setdefault(count + 1, OrderedDict())[key] = None
+
+    def on_remove(self, key):
+        count = self.freq.pop(key, None)
+        if count is None:
+            return
+        bucket = self.buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[count]
+            if self.min_freq == count:
+                self.min_freq = min(self.buckets) if self.buckets else 0
+
+    def victim(self):
+        return next(iter(self.buckets[self.min_freq]))
+
+
+POLICIES = {
+    "lru": LRUPolicy,
+    "lfu": LFUPolicy,
+    "fifo": FIFOPolicy,
+    "ttl": TTLPolicy,
+}
+
+
+class AnswerCache:
+    """
+    Caché de respuestas con política de expulsión intercambiable y capacidad
+    en bytes de texto de respuesta (UTF-8), no en cantidad de entradas.
+    Lleva métricas totales y por ventanas de tiempo para /cache/stats.
+    """
+
+    def __init__(self, capacity_bytes, policy="lru", ttl_seconds=0.0,
+                 window_seconds=60.0, max_windows=60):
+        if policy not in POLICIES:
+            raise ValueError(f"Política desconocida: {policy}. Use: {', '.join(POLICIES)}")
+        if policy == "ttl" and ttl_seconds <= 0:
+            raise ValueError("La política ttl requiere ttl_seconds > 0")
+
+        self.capacity_bytes = capacity_bytes
+        self.policy_name = policy
+        self.policy = POLICIES[policy]()
+        self.ttl_seconds = ttl_seconds
+        self.entries = {}  # clave -> (respuesta, bytes, instante de inserción)
+        self.bytes_used = 0
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.rejected = 0  # respuestas más grandes que la capacidad completa
+
+        self.window_seconds = window_seconds
+        self.windows = deque(maxlen=max_windows)  # [inicio, aciertos, fallos, expulsiones]
+
+    def _window(self):
+        now = time.time()
+        start = now - now % self.window_seconds
+        if not self.windows or self.windows[-1][0] != start:
+            self.windows.append([start, 0, 0, 0])
+        return self.windows[-1]
+
+    def _remove(self, key):
+        _, size, _ = self.entries.pop(key)
+        self.bytes_used -= size
+        self.policy.on_remove(key)
+
+    def _expired(self, inserted_at):
+        return self.ttl_seconds > 0 and time.time() - inserted_at > self.ttl_seconds
+
+    def get(self, key):
+        """Retorna la respuesta guardada o None (cuenta acierto/fallo)"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self._expired(entry[2]):
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+
+            window = self._window()
+            if entry is None:
+                self.misses += 1
+                window[2] += 1
+                return None
+
+            self.hits += 1
+            window[1] += 1
+            self.policy.on_access(key)
+            return entry[0]
+
+    def put(self, key, answer):
+        """Guarda una respuesta, expulsando entradas hasta que quepa"""
+        size = len(answer.encode("utf-8"))
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            if size > self.capacity_bytes:
+                self.rejected += 1
+                return
+
+            window = self._window()
+            while self.bytes_used + size > self.capacity_bytes:
+                victim = self.policy.victim()
+                self._remove(victim)
+                self.evictions += 1
+                window[3] += 1
+
+            self.entries[key] = (answer, size, time.time())
+            self.bytes_used += size
+            self.policy.on_insert(key)
+
+    def stats(self):
+        """Métricas totales y por ventana de tiempo"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "policy": self.policy_name,
+                "capacity_bytes": self.capacity_bytes,
+                "bytes_used": self.bytes_used,
+                "entries": len(self.entries),
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "rejected": self.rejected,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "window_seconds": self.window_seconds,
+                "windows": [
+                    {
+                        "start": start,
+                        "hits": hits,
+                        "misses": misses,
+                        "evictions": evictions,
+                        "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0
+                    }
+                    for start, hits, misses, evictions in self.windows
+                ]
+            }
@@ -0,0 +1,207 @@
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from functools import lru_cache
+
+import psycopg2
+
+
+class MockUpstreamError(Exception):
+    """Error simulado del proveedor (según error_rate)"""
+
+
+FILLER_WORDS = (
+    "generally", "usually", "think", "maybe", "really", "answer", "question",
+    "depends", "people", "best", "good", "time", "know", "help", "way", "also"
+)
+
+
+def load_replay_latencies(path):
+    """
+    Latencias medidas para el modo replay, en segundos. Acepta:
+    - el reporte JSON del generador de tráfico (histograma de la etapa "llm")
+    - una lista JSON de latencias en ms
+    - un archivo de texto con una latencia en ms por línea
+    Retorna (valores, pesos).
+    """
+    with open(path) as f:
+        content = f.read()
+
+    try:
+        data = json.loads(content)
+    except ValueError:
+        values = [float(line) / 1000 for line in content.split() if line.strip()]
+        return values, [1] * len(values)
+
+    if isinstance(data, list):
+        return [float(v) / 1000 for v in data], [1] * len(data)
+
+    # Histograma de LatencyHistogram: bucket k representa ~(1+p)^(k-0.5) µs
+    histogram = data["histograms"]["llm"]
+    log_base = math.log1p(histogram["precision"])
+    values, weights = [], []
+    for index, count in histogram["buckets"].items():
+        index = int(index)
+        values.append(0.0 if index == 0 else math.exp((index - 0.5) * log_base) / 1e6)
+        weights.append(count)
+    return values, weights
+
+
+class MockBackend:
+    """
+    Backend sin red que reemplaza a Gemini en pruebas de carga.
+    La respuesta es determinista por consulta: se deriva del best_answer de la
+    pregunta (si se conoce su id y la base responde) con una fracción de
+    palabras alterada según noise, o se sintetiza a partir de la consulta.
+    La latencia sigue el modo elegido (fixed, lognormal o replay) y una
+    fracción error_rate de las llamadas falla.
+    """
+
+    def __init__(self, latency_mode="fixed", latency_ms=200.0, latency_sigma=0.5,
+                 replay_path=None, error_rate=0.0, noise=0.1, answer_words=60,
+                 seed=None, db_config=None, ttft_fraction=0.3, chunk_words=8):
+        if latency_mode not in ("fixed", "lognormal", "replay"):
+            raise ValueError("latency_mode debe ser 'fixed', 'lognormal' o 'replay'")
+        if latency_mode == "replay" and not replay_path:
+            raise ValueError("El modo replay requiere un archivo de latencias")
+
+        self.latency_mode = latency_mode
+        self.latency_s = latency_ms / 1000
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.noise = noise
+        self.answer_words = answer_words
+        self.ttft_fraction = ttft_fraction  # parte de la latencia antes del primer fragmento al transmitir
+        self.chunk_words = chunk_words
+        self.seed = seed or 0
+        self.rng = random.Random(seed)  # latencias y errores: reproducibles por corrida
+        self.db_config = db_config
+        self.db = {"conn": None}
+        self.db_lock = threading.Lock()
+
+        self.replay = None
+        if latency_mode == "replay":
+            self.replay = load_replay_latencies(replay_path)
+            print(f"⏱️ Latencias de replay cargadas: {len(self.replay[0])} valores desde {replay_path}")
+
+        self.calls = 0
+        self.errors = 0
+        self.from_best_answer = 0
+
+    def sample_latency(self):
+        if self.latency_mode == "fixed":
+            return self.latency_s
+        if self.latency_mode == "lognormal":
+            # latency_ms es la mediana; sigma controla el largo de la cola
+            return self.rng.lognormvariate(math.log(self.latency_s), self.latency_sigma)
+        values, weights = self.replay
+        return self.rng.choices(values, weights=weights)[0]
+
+    def get_connection(self):
+        conn = self.db["conn"]
+        if conn is None or conn.closed:
+            conn = psycopg2.connect(**self.db_config)
+            conn.autocommit = True
+            self.db["conn"] = conn
+        return conn
+
+    @lru_cache(maxsize=10000)
+    def load_best_answer(self, question_id):
+        with self.db_lock:
+            cur = self.get_connection().cursor()
+            cur.execute("SELECT best_answer FROM yahoo_answers WHERE id = %s", (question_id,))
+            row = cur.fetchone()
+            cur.close()
+        return row[0] if row else None
+
+    def lookup_best_answer(self, question_id):
+        """best_answer de la pregunta o None; los errores de conexión no quedan en caché"""
+        if question_id is None or self.db_config is None:
+            return None
+        try:
+            return self.load_best_answer(question_id)
+        except Exception as e:
+            print(f"⚠️ Mock: best_answer no disponible ({e}), se sintetiza la respuesta")
+            self.db["conn"] = None
+            return None
+
+    def build_answer(self, query, best_answer):
+        """Respuesta determinista: misma consulta, misma respuesta"""
+        digest = hashlib.sha1(f"{self.seed}:{query}".encode("utf-8")).hexdigest()
+        rng = random.Random(int(digest[:16], 16))
+
+        if best_answer:
+            words = best_answer.split()
+        else:
+            query_words = re.findall(r'\w+', query.lower()) or list(FILLER_WORDS)
+            words = [rng.choice(query_words) for _ in range(self.answer_words)]
+
+        # Ruido controlado: se reemplaza o elimina una fracción de las palabras
+        noisy = []
+        for word in words:
+            if rng.random() >= self.noise:
+                noisy.append(word)
+            elif rng.random() < 0.5:
+                noisy.append(rng.choice(FILLER_WORDS))
+        return " ".join(noisy)
+
+    async def prepare(self, query, question_id):
+        """Sortea latencia y error y arma la respuesta; retorna (inicio, latencia, falla, respuesta)"""
+        start = time.monotonic()
+        self.calls += 1
+        delay = self.sample_latency()
+        fail = self.rng.random() < self.error_rate
+
+        best_answer = None
+        if question_id is not None:
+            loop = asyncio.get_running_loop()
+            best_answer = await loop.run_in_executor(None, self.lookup_best_answer, question_id)
+        if best_answer and not fail:
+            self.from_best_answer += 1
+        return start, delay, fail, self.build_answer(query, best_answer)
+
+    async def generate(self, query, question_id=None):
+        start, delay, fail, answer = await self.prepare(query, question_id)
+
+        # La búsqueda en la base cuenta dentro de la latencia simulada
+        await asyncio.sleep(max(0.0, delay - (time.monotonic() - start)))
+
+        if fail:
+            self.errors += 1
+            raise MockUpstreamError("Error simulado del backend mock")
+        return answer
+
+    async def stream(self, query, question_id=None):
+        """
+        Versión en fragmentos de generate: el primero llega tras ttft_fraction
+        de la latencia sorteada y el resto se reparte en el tiempo restante.
+        """
+        start, delay, fail, answer = await self.prepare(query, question_id)
+        await asyncio.sleep(max(0.0, delay * self.ttft_fraction - (time.monotonic() - start)))
+
+        if fail:
+            self.errors += 1
+            raise MockUpstreamError("Error simulado del backend mock")
+
+        words = answer.split(" ")
+        chunks = [" ".join(words[i:i + self.chunk_words]) for i in range(0, len(words), self.chunk_words)]
+        gap = delay * (1 - self.ttft_fraction) / max(1, len(chunks) - 1)
+        for position, chunk in enumerate(chunks):
+            if position:
+                await asyncio.sleep(gap)
+            yield chunk if position == len(chunks) - 1 else chunk + " "
+
+    def stats(self):
+        return {
+            "latency_mode": self.latency_mode,
+            "error_rate": self.error_rate,
+            "noise": self.noise,
+            "calls": self.calls,
+            "errors": self.errors,
+            "from_best_answer": self.from_best_answer
+        }
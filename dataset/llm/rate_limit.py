@@ -0,0 +1,142 @@
+import asyncio
+import math
+import threading
+import time
+
+
+class Overloaded(Exception):
+    """La solicitud se descartó por límite de tasa o de concurrencia"""
+
+
+class TokenBucket:
+    """
+    Token bucket con reservas: cada solicitud toma un token y, si no hay,
+    reserva el siguiente (los tokens quedan negativos) y espera su turno.
+    Así las esperas respetan el orden de llegada sin un hilo rellenando.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last = time.monotonic()
+
+    def reserve(self, max_wait):
+        """Reserva un token; retorna los segundos a esperar o None si superaría max_wait"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        if wait > max_wait:
+            return None
+        self.tokens -= 1
+        return wait
+
+
+class UpstreamLimiter:
+    """
+    Admisión de llamadas upstream: token bucket ajustado a la cuota de la API
+    más un tope de llamadas concurrentes. Con policy="queue" el exceso espera
+    (hasta max_queue solicitudes y max_wait segundos); con "shed" se rechaza
+    de inmediato.
+    """
+
+    def __init__(self, concurrency, rate=0.0, burst=1, policy="queue",
+                 max_queue=0, max_wait=0.0):
+        if policy not in ("queue", "shed"):
+            raise ValueError("policy debe ser 'queue' o 'shed'")
+        self.concurrency = concurrency
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.bucket = TokenBucket(rate, max(1, burst)) if rate > 0 else None
+        self.policy = policy
+        self.max_queue = max_queue
+        self.max_wait = max_wait if max_wait > 0 else math.inf
+
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_rate = 0
+        self.rejected_concurrency = 0
+        self.waiting = 0
+        self.active = 0
+        self.total_wait = 0.0
+
+    async def acquire(self):
+        """Espera turno para una llamada upstream o lanza Overloaded"""
+        shed = self.policy == "shed"
+        if self.semaphore.locked() and (shed or (self.max_queue and self.waiting >= self.max_queue)):
+            self.rejected_concurrency += 1
+            raise Overloaded("Demasiadas llamadas concurrentes al LLM")
+
+        wait = 0.0
+        if self.bucket is not None:
+            wait = self.bucket.reserve(0.0 if shed else self.max_wait)
+            if wait is None:
+                self.rejected_rate += 1
+                raise Overloaded("Límite de tasa del LLM excedido")
+
+        start = time.monotonic()
+        if wait > 0 or self.semaphore.locked():
+            self.queued += 1
+            self.waiting += 1
+            try:
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                await self.semaphore.acquire()
+            finally:
+                self.waiting -= 1
+        else:
+            await self.semaphore.acquire()
+
+        self.total_wait += time.monotonic() - start
+        self.admitted += 1
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+        self.semaphore.release()
+
+    def stats(self):
+        return {
+            "policy": self.policy,
+            "concurrency": self.concurrency,
+            "rate_per_s": self.bucket.rate if self.bucket else None,
+            "burst": self.bucket.burst if self.bucket else None,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected_rate": self.rejected_rate,
+            "rejected_concurrency": self.rejected_concurrency,
+            "mean_wait_ms": round(self.total_wait / self.admitted * 1000, 3) if self.admitted else 0.0
+        }
+
+
+class StreamSlot:
+    """
+    Cupo del limitador tomado por un stream. close() es idempotente: pide al
+    hilo productor que se detenga y devuelve el cupo recién cuando no queda
+    ninguna llamada upstream en curso, así un cliente que se desconecta no
+    deja el cupo tomado ni permite más llamadas reales que las admitidas.
+    Todos los métodos se llaman desde el event loop.
+    """
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.stop = threading.Event()  # lo revisa el hilo productor entre fragmentos
+        self.producers = 0
+        self.released = False
+
+    def producer_started(self):
+        self.producers += 1
+
+    def producer_finished(self):
+        self.producers -= 1
+        if self.stop.is_set():
+            self.close()
+
+    def close(self):
+        self.stop.set()
+        if self.producers == 0 and not self.released:
+            self.released = True
+            self.limiter.release()
@@ -1,24 +1,378 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from concurrent.futures import ThreadPoolExecutor
+from pydantic import BaseModel
+from typing import List, Optional
 import google.generativeai as genai
+import asyncio
+import json
 import os
+import threading
+import time
+import psycopg2
 
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+from answer_cache import AnswerCache, cache_key
+from mock_backend import MockBackend
+from similar_cache import SimilarAnswerIndex, load_query_results
+from rate_limit import Overloaded, StreamSlot, UpstreamLimiter
+from single_flight import SingleFlight
 
-print("📌 Modelos disponibles:")
-for m in genai.list_models():
-    print(f"- {m.name} -> {m.supported_generation_methods}")
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini").lower()  # "gemini" o "mock" (sin red, para pruebas de carga)
+MODEL_NAME = os.getenv("MODEL_NAME", "gemini-2.5-flash-lite")
+
+# Configuración del backend mock
+MOCK_LATENCY_MODE = os.getenv("MOCK_LATENCY_MODE", "fixed")  # "fixed", "lognormal" o "replay"
+MOCK_LATENCY_MS = float(os.getenv("MOCK_LATENCY_MS", "200"))  # fija, o mediana en lognormal
+MOCK_LATENCY_SIGMA = float(os.getenv("MOCK_LATENCY_SIGMA", "0.5"))  # dispersión de la lognormal
+MOCK_LATENCY_FILE = os.getenv("MOCK_LATENCY_FILE", "")  # reporte del generador o latencias medidas (ms)
+MOCK_ERROR_RATE = float(os.getenv("MOCK_ERROR_RATE", "0"))  # fracción de llamadas que fallan
+MOCK_NOISE = float(os.getenv("MOCK_NOISE", "0.1"))  # fracción de palabras alteradas del best_answer
+MOCK_TTFT_FRACTION = float(os.getenv("MOCK_TTFT_FRACTION", "0.3"))  # latencia antes del primer fragmento en /ask/stream
+MOCK_SEED = os.getenv("MOCK_SEED")
+MOCK_USE_DB = os.getenv("MOCK_USE_DB", "1") == "1"  # derivar la respuesta del best_answer en la base
+
+# Base de datos (solo la usa el backend mock para leer best_answer)
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "postgres"),
+    "port": os.getenv("DB_PORT", "5432"),
+    "user": os.getenv("DB_USER", "postgres"),
+    "password": os.getenv("DB_PASSWORD", "postgres"),
+    "dbname": os.getenv("DB_NAME", "yahoo_dataset")
+}
+
+# Configuración del caché de respuestas delante de /ask
+CACHE_POLICY = os.getenv("CACHE_POLICY", "lru").lower()  # "lru", "lfu", "fifo", "ttl" o "none"
+CACHE_CAPACITY_BYTES = int(os.getenv("CACHE_CAPACITY_BYTES", str(64 * 1024 * 1024)))  # bytes de texto de respuesta
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "0"))  # 0 = sin vencimiento (obligatorio con "ttl")
+CACHE_STATS_WINDOW = float(os.getenv("CACHE_STATS_WINDOW", "60"))  # segundos por ventana en /cache/stats
+
+# Reutilización de respuestas de preguntas parecidas (paráfrasis) ya guardadas en query_results
+SIMILAR_CACHE = os.getenv("SIMILAR_CACHE", "0") == "1"
+SIMILAR_THRESHOLD = float(os.getenv("SIMILAR_THRESHOLD", "0.8"))  # Jaccard mínimo entre conjuntos de tokens
+SIMILAR_NUM_PERM = int(os.getenv("SIMILAR_NUM_PERM", "64"))  # permutaciones MinHash
+SIMILAR_BANDS = int(os.getenv("SIMILAR_BANDS", "16"))  # bandas LSH (más bandas = más candidatos)
+SIMILAR_MIN_TOKENS = int(os.getenv("SIMILAR_MIN_TOKENS", "3"))  # consultas más cortas no se reutilizan
+SIMILAR_REFRESH_SECONDS = float(os.getenv("SIMILAR_REFRESH_SECONDS", "300"))  # recarga desde query_results
+
+# Configuración de admisión de llamadas a Gemini
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))  # llamadas upstream simultáneas (= hilos)
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", "0"))  # cuota de la API en solicitudes/s; 0 = sin límite
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "1"))  # ráfaga permitida por el token bucket
+OVERLOAD_POLICY = os.getenv("OVERLOAD_POLICY", "queue").lower()  # "queue" espera turno, "shed" responde 429
+MAX_QUEUE = int(os.getenv("MAX_QUEUE", "0"))  # solicitudes esperando como máximo; 0 = sin límite
+MAX_QUEUE_WAIT = float(os.getenv("MAX_QUEUE_WAIT", "0"))  # segundos máximos de espera por tasa; 0 = sin límite
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "100"))  # consultas por solicitud en /ask/batch
+
+answer_cache = None
+if CACHE_POLICY != "none":
+    answer_cache = AnswerCache(CACHE_CAPACITY_BYTES, policy=CACHE_POLICY,
+                               ttl_seconds=CACHE_TTL_SECONDS,
+                               window_seconds=CACHE_STATS_WINDOW)
+    print(f"🗃️ Caché de respuestas: política={CACHE_POLICY}, capacidad={CACHE_CAPACITY_BYTES} bytes")
+
+# Cliente reutilizado por todas las solicitudes; generate_content es bloqueante,
+# así que corre en un pool de hilos propio para no detener el event loop
+model = None
+mock = None
+if LLM_BACKEND == "mock":
+    mock = MockBackend(latency_mode=MOCK_LATENCY_MODE, latency_ms=MOCK_LATENCY_MS,
+                       latency_sigma=MOCK_LATENCY_SIGMA, replay_path=MOCK_LATENCY_FILE,
+                       error_rate=MOCK_ERROR_RATE, noise=MOCK_NOISE,
+                       ttft_fraction=MOCK_TTFT_FRACTION,
+                       seed=int(MOCK_SEED) if MOCK_SEED else None,
+                       db_config=DB_CONFIG if MOCK_USE_DB else None)
+    print(f"🧪 Backend mock: latencia={MOCK_LATENCY_MODE}, errores={MOCK_ERROR_RATE}")
+else:
+    genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+    model = genai.GenerativeModel(MODEL_NAME)
+executor = ThreadPoolExecutor(max_workers=LLM_CONCURRENCY, thread_name_prefix="gemini")
+limiter = UpstreamLimiter(LLM_CONCURRENCY, rate=RATE_LIMIT_RPS, burst=RATE_LIMIT_BURST,
+                          policy=OVERLOAD_POLICY, max_queue=MAX_QUEUE, max_wait=MAX_QUEUE_WAIT)
+
+# Solicitudes idénticas concurrentes comparten una sola llamada a Gemini
+single_flight = SingleFlight()
+
+similar_index = None
+if SIMILAR_CACHE:
+    similar_index = SimilarAnswerIndex(threshold=SIMILAR_THRESHOLD, num_perm=SIMILAR_NUM_PERM,
+                                       bands=SIMILAR_BANDS, min_tokens=SIMILAR_MIN_TOKENS)
+    print(f"🔎 Reutilización por similitud: umbral={SIMILAR_THRESHOLD}, "
+          f"{SIMILAR_NUM_PERM} permutaciones en {SIMILAR_BANDS} bandas")
+
+# Lista de modelos: se consulta recién cuando alguien la pide en /models
+available_models = None
+
+batch_stats = {"batches": 0, "items": 0, "item_errors": 0}
+stream_stats = {"streams": 0, "errors": 0, "ttft_sum": 0.0, "ttft_count": 0}
+
+# Modelos para /ask/batch
+class AskItem(BaseModel):
+    query: str
+    question_id: Optional[int] = None
+
+class AskBatchRequest(BaseModel):
+    items: List[AskItem]
 
 app = FastAPI()
 
+def refresh_similar_index():
+    """Hilo de fondo: indexa query_results al iniciar y luego cada SIMILAR_REFRESH_SECONDS"""
+    while True:
+        try:
+            conn = psycopg2.connect(**DB_CONFIG)
+            try:
+                start = time.time()
+                count = load_query_results(conn, similar_index)
+                print(f"🔎 Índice de similitud: {count} respuestas leídas en {time.time() - start:.2f}s "
+                      f"({len(similar_index.entries)} indexadas)")
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"⚠️ No se pudo cargar query_results en el índice de similitud: {e}")
+        time.sleep(SIMILAR_REFRESH_SECONDS)
+
+@app.on_event("startup")
+def start_similar_index():
+    if similar_index is not None:
+        threading.Thread(target=refresh_similar_index, daemon=True).start()
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+@app.get("/models")
+async def models():
+    global available_models
+    if mock is not None:
+        return {"model": "mock", "available": []}
+    if available_models is None:
+        loop = asyncio.get_running_loop()
+        listed = await loop.run_in_executor(executor, lambda: list(genai.list_models()))
+        available_models = [
+            {"name": m.name, "methods": list(m.supported_generation_methods)}
+            for m in listed
+        ]
+        print("📌 Modelos disponibles:")
+        for m in available_models:
+            print(f"- {m['name']} -> {m['methods']}")
+    return {"model": MODEL_NAME, "available": available_models}
+
+@app.get("/cache/stats")
+def cache_stats():
+    if answer_cache is None:
+        return {"policy": "none"}
+    return answer_cache.stats()
+
+@app.get("/cache/similar/stats")
+def similar_cache_stats():
+    if similar_index is None:
+        return {"enabled": False}
+    return {"enabled": True, **similar_index.stats()}
+
+@app.get("/stats")
+def stats():
+    result = {
+        "backend": LLM_BACKEND,
+        "single_flight": single_flight.stats(),
+        "limiter": limiter.stats(),
+        "batch": batch_stats,
+        "stream": {
+            "streams": stream_stats["streams"],
+            "errors": stream_stats["errors"],
+            "mean_ttft_ms": round(stream_stats["ttft_sum"] / stream_stats["ttft_count"] * 1000, 3)
+            if stream_stats["ttft_count"] else 0.0
+        }
+    }
+    if mock is not None:
+        result["mock"] = mock.stats()
+    return result
+
+async def call_backend(query: str, question_id: Optional[int]) -> str:
+    """Llamada al backend configurado: Gemini en el pool de hilos o el mock asíncrono"""
+    if mock is not None:
+        return await mock.generate(query, question_id)
+    loop = asyncio.get_running_loop()
+    response = await loop.run_in_executor(executor, model.generate_content, query)
+    return response.text
+
+async def generate_answer(query: str, key: str, question_id: Optional[int] = None) -> str:
+    """Llamada upstream; la ejecuta solo el primero de cada grupo coalescido"""
+    await limiter.acquire()
+    try:
+        answer = await call_backend(query, question_id)
+    finally:
+        limiter.release()
+
+    # Solo se guardan respuestas exitosas; los errores no quedan en caché
+    if answer_cache is not None:
+        answer_cache.put(key, answer)
+    await index_answer(question_id, query, answer)
+    return answer
+
+# Las firmas MinHash son trabajo de CPU: se calculan en el pool por defecto del
+# loop, no en el event loop ni en los hilos reservados para llamadas upstream
+async def index_answer(question_id: Optional[int], query: str, answer: str):
+    """Agrega una respuesta nueva al índice de similitud"""
+    if similar_index is None or question_id is None:
+        return
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, similar_index.add, question_id, query, answer)
+
+async def find_reusable(query: str, question_id: Optional[int]):
+    """Respuesta de una pregunta parecida por sobre el umbral, o None"""
+    if similar_index is None:
+        return None
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, similar_index.find, query, question_id)
+
+async def answer_query(query: str, question_id: Optional[int] = None) -> dict:
+    """Caché -> similitud -> coalescencia -> límites -> backend. Lanza la excepción del upstream si falla"""
+    key = cache_key(query)
+    if answer_cache is not None:
+        cached = answer_cache.get(key)
+        if cached is not None:
+            return {"answer": cached, "cached": True}
+
+    reused = await find_reusable(query, question_id)
+    if reused is not None:
+        answer = reused.pop("answer")
+        return {"answer": answer, "reused": reused}
+
+    answer = await single_flight.do(key, lambda: generate_answer(query, key, question_id))
+    return {"answer": answer}
+
 @app.get("/ask")
-async def ask(query: str):
+async def ask(query: str, question_id: Optional[int] = None):
+    # question_id es opcional: solo lo usa el backend mock para derivar la respuesta
     try:
-        model = genai.GenerativeModel("gemini-2.5-flash-lite")
-        response = model.generate_content(query)
-        return {"answer": response.text}
+        return await answer_query(query, question_id)
+    except Overloaded as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         return {"error": str(e)}
+
+async def stream_backend(query: str, question_id: Optional[int], slot: StreamSlot):
+    """
+    Fragmentos de la respuesta a medida que llegan del backend. El hilo
+    productor se detiene cuando slot.stop se activa y avisa al slot al terminar.
+    """
+    if mock is not None:
+        async for chunk in mock.stream(query, question_id):
+            yield chunk
+        return
+
+    # El iterador de Gemini es bloqueante: un hilo del pool lo recorre y
+    # entrega cada fragmento al event loop por una cola
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    def produce():
+        try:
+            for chunk in model.generate_content(query, stream=True):
+                if slot.stop.is_set():
+                    break  # el cliente se fue: no seguir consumiendo la llamada upstream
+                loop.call_soon_threadsafe(queue.put_nowait, ("chunk", chunk.text))
+            loop.call_soon_threadsafe(queue.put_nowait, ("done", None))
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, ("error", e))
+        finally:
+            loop.call_soon_threadsafe(slot.producer_finished)
+
+    slot.producer_started()
+    loop.run_in_executor(executor, produce)
+    while True:
+        kind, value = await queue.get()
+        if kind == "error":
+            raise value
+        if kind == "done":
+            return
+        yield value
+
+def ndjson(event: dict) -> str:
+    return json.dumps(event, ensure_ascii=False) + "\n"
+
+@app.get("/ask/stream")
+async def ask_stream(query: str, question_id: Optional[int] = None):
+    """
+    Variante de /ask que transmite la respuesta en NDJSON a medida que llega:
+    líneas {"token": ...} y al final {"done": true, "cached": ...} o {"error": ...}.
+    No se coalesce con otras solicitudes; la respuesta completa sí queda en caché
+    (y en el índice de similitud).
+    """
+    key = cache_key(query)
+    cached = answer_cache.get(key) if answer_cache is not None else None
+    if cached is not None:
+        async def replay_cached():
+            yield ndjson({"token": cached})
+            yield ndjson({"done": True, "cached": True})
+        return StreamingResponse(replay_cached(), media_type="application/x-ndjson")
+
+    reused = await find_reusable(query, question_id)
+    if reused is not None:
+        async def replay_reused():
+            yield ndjson({"token": reused.pop("answer")})
+            yield ndjson({"done": True, "cached": False, "reused": reused})
+        return StreamingResponse(replay_reused(), media_type="application/x-ndjson")
+
+    # La admisión se decide antes de empezar a responder, para poder devolver 429
+    try:
+        await limiter.acquire()
+    except Overloaded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    slot = StreamSlot(limiter)
+
+    async def events():
+        stream_stats["streams"] += 1
+        start = time.perf_counter()
+        parts = []
+        try:
+            async for chunk in stream_backend(query, question_id, slot):
+                if not parts:
+                    stream_stats["ttft_sum"] += time.perf_counter() - start
+                    stream_stats["ttft_count"] += 1
+                parts.append(chunk)
+                yield ndjson({"token": chunk})
+        except Exception as e:
+            stream_stats["errors"] += 1
+            yield ndjson({"error": str(e)})
+            return
+        finally:
+            slot.close()
+
+        if answer_cache is not None:
+            answer_cache.put(key, "".join(parts))
+        await index_answer(question_id, query, "".join(parts))
+        yield ndjson({"done": True, "cached": False})
+
+    # Si el cliente se desconecta antes de que empiece el cuerpo, events() nunca
+    # corre su finally: la tarea de fondo garantiza que el cupo se devuelva
+    return StreamingResponse(events(), media_type="application/x-ndjson",
+                             background=BackgroundTask(slot.close))
+
+@app.post("/ask/batch")
+async def ask_batch(request: AskBatchRequest):
+    """
+    Responde varias consultas en una solicitud. Se resuelven en paralelo con
+    el mismo caché, coalescencia y límites de tasa que /ask; los resultados
+    vuelven en el orden recibido y cada uno trae su propio error si falló.
+    """
+    if len(request.items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_BATCH_SIZE} consultas por lote")
+
+    outcomes = await asyncio.gather(
+        *[answer_query(item.query, item.question_id) for item in request.items],
+        return_exceptions=True
+    )
+
+    results = []
+    for outcome in outcomes:
+        if isinstance(outcome, Exception):
+            batch_stats["item_errors"] += 1
+            results.append({"error": str(outcome), "overloaded": isinstance(outcome, Overloaded)})
+        else:
+            results.append(outcome)
+
+    batch_stats["batches"] += 1
+    batch_stats["items"] += len(request.items)
+    return {"results": results}
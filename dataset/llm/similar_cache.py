@@ -0,0 +1,169 @@
+import os
+import re
+import sys
+import threading
+
+try:
+    from minhash import MinHasher
+except ImportError:
+    # Fuera de Docker: la misma implementación vectorizada del servicio de score
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "score"))
+    from minhash import MinHasher
+
+
+def preprocess_text(text: str) -> str:
+    """Limpia y normaliza el texto (misma normalización que score y loader)"""
+    if not text:
+        return ""
+    text = text.lower()
+    text = re.sub(r'[^\w\s]', ' ', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+
+def token_set(text: str) -> frozenset:
+    return frozenset(preprocess_text(text).split())
+
+
+class SimilarAnswerIndex:
+    """
+    Índice de preguntas ya respondidas para reutilizar respuestas de
+    paráfrasis: firmas MinHash de los conjuntos de tokens normalizados y LSH
+    por bandas para encontrar candidatos sin recorrer todo el índice. Los
+    candidatos se confirman con Jaccard exacto contra threshold.
+    Las firmas usan MinHasher de score/minhash.py (vectorizado con numpy);
+    find y add son bloqueantes, el servidor los corre fuera del event loop.
+    """
+
+    def __init__(self, threshold=0.8, num_perm=64, bands=16, min_tokens=3, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm debe ser múltiplo de bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        # Un conjunto vacío no tiene firma
+        self.min_tokens = max(1, min_tokens)
+        self.minhasher = MinHasher(num_perm, seed=seed)
+
+        self.entries = []  # [question_id, tokens, respuesta, quality_score]
+        self.by_question = {}  # question_id -> posición en entries
+        self.buckets = [{} for _ in range(bands)]  # por banda: hash de la banda -> posiciones
+        self.lock = threading.Lock()
+
+        self.lookups = 0
+        self.reuses = 0
+        self.same_question = 0
+        self.similarity_sum = 0.0
+        self.candidates_checked = 0
+        self.reused_quality_sum = 0.0
+        self.reused_quality_count = 0
+
+    def band_keys(self, tokens):
+        signature = self.minhasher.signature(tokens)
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes()
+                for band in range(self.bands)]
+
+    def add(self, question_id, text, answer, quality_score=None):
+        """Indexa (o actualiza) la respuesta de una pregunta"""
+        tokens = token_set(text)
+        if len(tokens) < self.min_tokens or not answer:
+            return
+        with self.lock:
+            position = self.by_question.get(question_id)
+            if position is not None:
+                entry = self.entries[position]
+                entry[2] = answer
+                if quality_score is not None:
+                    entry[3] = quality_score
+                return
+
+        keys = self.band_keys(tokens)
+        with self.lock:
+            if question_id in self.by_question:
+                return
+            position = len(self.entries)
+            self.entries.append([question_id, tokens, answer, quality_score])
+            self.by_question[question_id] = position
+            for band, key in enumerate(keys):
+                self.buckets[band].setdefault(key, []).append(position)
+
+    def find(self, text, question_id=None):
+        """
+        Retorna la respuesta más parecida por sobre el umbral como
+        {"answer", "question_id", "similarity", "quality_score"}, o None.
+        """
+        tokens = token_set(text)
+        with self.lock:
+            self.lookups += 1
+        if len(tokens) < self.min_tokens:
+            return None
+
+        keys = self.band_keys(tokens)
+        with self.lock:
+            candidates = set()
+            for band, key in enumerate(keys):
+                candidates.update(self.buckets[band].get(key, ()))
+            candidates = [self.entries[position] for position in candidates]
+
+        best, best_similarity = None, 0.0
+        for entry in candidates:
+            similarity = len(tokens & entry[1]) / len(tokens | entry[1])
+            if similarity > best_similarity:
+                best, best_similarity = entry, similarity
+
+        with self.lock:
+            self.candidates_checked += len(candidates)
+            if best is None or best_similarity < self.threshold:
+                return None
+
+            self.reuses += 1
+            self.similarity_sum += best_similarity
+            if question_id is not None and best[0] == question_id:
+                self.same_question += 1
+            if best[3] is not None:
+                self.reused_quality_sum += best[3]
+                self.reused_quality_count += 1
+        return {
+            "answer": best[2],
+            "question_id": best[0],
+            "similarity": round(best_similarity, 4),
+            "quality_score": best[3]
+        }
+
+    def stats(self):
+        return {
+            "threshold": self.threshold,
+            "num_perm": self.num_perm,
+            "bands": self.bands,
+            "indexed": len(self.entries),
+            "lookups": self.lookups,
+            "reuses": self.reuses,
+            "same_question_reuses": self.same_question,
+            "reuse_rate": round(self.reuses / self.lookups, 4) if self.lookups else 0.0,
+            "mean_similarity": round(self.similarity_sum / self.reuses, 4) if self.reuses else 0.0,
+            "mean_candidates": round(self.candidates_checked / self.lookups, 3) if self.lookups else 0.0,
+            # Calidad que tuvo la respuesta reutilizada para su pregunta original;
+            # la calidad frente a la pregunta nueva la mide el generador de tráfico
+            "reused_source_quality_mean": round(self.reused_quality_sum / self.reused_quality_count, 4)
+            if self.reused_quality_count else None
+        }
+
+
+def load_query_results(conn, index, chunk_size=5000):
+    """Indexa la última respuesta guardada de cada pregunta en query_results"""
+    cur = conn.cursor(name="similar_index")
+    cur.itersize = chunk_size
+    cur.execute("""
+        SELECT DISTINCT ON (question_id)
+               question_id, question_title, question_content, llm_answer, quality_score
+        FROM query_results
+        WHERE llm_answer IS NOT NULL AND llm_answer <> ''
+        ORDER BY question_id, updated_at DESC
+    """)
+    count = 0
+    for question_id, title, content, answer, quality_score in cur:
+        index.add(question_id, f"{title or ''} {content or ''}", answer, quality_score)
+        count += 1
+    cur.close()
+    return count
@@ -0,0 +1,48 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalescencia de llamadas idénticas en curso: la primera solicitud para una
+    clave ejecuta la llamada y las que llegan mientras tanto esperan el mismo
+    resultado (o la misma excepción) en vez de repetir la llamada upstream.
+    """
+
+    def __init__(self):
+        self.inflight = {}  # clave -> asyncio.Future con el resultado compartido
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        """Ejecuta la corrutina fn() una sola vez por clave en curso"""
+        future = self.inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # shield: si se cancela quien espera, no se cancela la llamada compartida
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        self.leaders += 1
+        try:
+            result = await fn()
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # marcada como leída aunque nadie más esperara
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if not future.done():
+                future.cancel()
+            self.inflight.pop(key, None)
+
+    def stats(self):
+        total = self.leaders + self.coalesced
+        return {
+            "upstream_calls": self.leaders,
+            "coalesced": self.coalesced,
+            "in_flight": len(self.inflight),
+            "coalesced_ratio": round(self.coalesced / total, 4) if total else 0.0
+        }
@@ -1,4 +1,11 @@
+import csv
+import glob
+import io
 import os
+import re
+import time
+from collections import Counter
+from multiprocessing import Pool
 import pandas as pd
 import psycopg2
 
@@ -8,45 +15,426 @@ port = os.getenv("PGPORT", "5432")
 user = os.getenv("PGUSER", "postgres")
 password = os.getenv("PGPASSWORD", "postgres")
 database = os.getenv("PGDATABASE", "yahoo_dataset")
-csv_path = os.getenv("CSV_PATH", "/data/test.csv")
+csv_path = os.getenv("CSV_PATH", "/data/test.csv")  # archivo, patrón glob o lista separada por comas
 table_name = os.getenv("TABLE_NAME", "yahoo_answers")
+chunk_size = int(os.getenv("CHUNK_SIZE", "50000"))  # filas por bloque leído y enviado con COPY
+csv_has_header = os.getenv("CSV_HAS_HEADER", "1") == "1"  # la primera línea de cada archivo es encabezado
 
-print(f"Conectando a PostgreSQL {host}:{port}, db={database}, tabla={table_name}")
-print(f"Leyendo CSV desde {csv_path} ...")
-
-# Leer CSV
-df = pd.read_csv(csv_path)
-
-# Conexión
-conn = psycopg2.connect(
-    host=host, port=port, user=user, password=password, dbname=database
-)
-cur = conn.cursor()
-
-# Crear tabla (drop + create para evitar duplicados)
-cur.execute(f"""
-    DROP TABLE IF EXISTS {table_name};
-    CREATE TABLE {table_name} (
-        id SERIAL PRIMARY KEY,
-        class INT,
-        question_title TEXT,
-        question_content TEXT,
-        best_answer TEXT
-    );
-""")
-
-# Insertar filas
-for _, row in df.iterrows():
-    cur.execute(
-        f"""
-        INSERT INTO {table_name} (class, question_title, question_content, best_answer)
-        VALUES (%s, %s, %s, %s)
-        """,
-        (int(row[0]), str(row[1]), str(row[2]), str(row[3])),
+# "incremental" retoma desde los checkpoints; "full" borra la tabla y carga todo de nuevo
+load_mode = os.getenv("LOAD_MODE", "incremental")
+workers = int(os.getenv("LOADER_WORKERS", "4"))  # procesos que cargan shards en paralelo
+# Tamaño de cada shard (rango de bytes alineado a fin de línea; supone una fila por línea).
+# 0 = un shard por archivo. No cambiar SHARD_BYTES ni CHUNK_SIZE entre reinicios de una carga.
+shard_bytes = int(os.getenv("SHARD_BYTES", str(64 * 1024 * 1024)))
+# Precalcular best_answer normalizado, su conjunto de tokens y las frecuencias de
+# documento del corpus, para que el servicio de score no repita ese trabajo
+precompute = os.getenv("PRECOMPUTE", "0") == "1"
+
+COLUMNS = ("class", "question_title", "question_content", "best_answer")
+
+
+def connect():
+    return psycopg2.connect(
+        host=host, port=port, user=user, password=password, dbname=database
     )
 
-conn.commit()
-cur.close()
-conn.close()
 
-print("✅ Datos cargados en la tabla", table_name)
+def is_untracked_table(cur):
+    """
+    True si la tabla ya tiene filas pero ningún checkpoint: la llenó una versión
+    anterior del loader y una carga incremental duplicaría todas sus filas.
+    """
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL, to_regclass('loader_shards') IS NOT NULL",
+                (table_name,))
+    table_exists, checkpoints_exist = cur.fetchone()
+    if not table_exists:
+        return False
+
+    cur.execute(f"SELECT EXISTS (SELECT 1 FROM {table_name})")
+    if not cur.fetchone()[0]:
+        return False
+    if not checkpoints_exist:
+        return True
+
+    cur.execute("""
+        SELECT EXISTS (SELECT 1 FROM loader_checkpoints WHERE table_name = %s)
+            OR EXISTS (SELECT 1 FROM loader_shards WHERE table_name = %s)
+    """, (table_name, table_name))
+    return not cur.fetchone()[0]
+
+
+def create_table(cur):
+    """Crea la tabla (si no existe) sin índices, junto con las tablas de checkpoints"""
+    global load_mode
+
+    if load_mode == "incremental" and is_untracked_table(cur):
+        print(f"⚠️  {table_name} tiene filas sin checkpoints (cargada por una versión anterior): "
+              f"se recarga completa en modo full")
+        load_mode = "full"
+    else:
+        print(f"Modo {load_mode}: {'se recarga la tabla completa' if load_mode == 'full' else 'se retoma desde los checkpoints'}")
+
+    if load_mode == "full":
+        # drop para evitar duplicados y olvidar los checkpoints de cargas anteriores.
+        # Los ids SERIAL se renumeran, así que el precálculo de score (que se indexa
+        # por id) se borra también aunque esta carga no use PRECOMPUTE
+        cur.execute(f"""
+            DROP TABLE IF EXISTS {table_name}, {table_name}_normalized,
+                {table_name}_df, {table_name}_corpus_stats
+        """)
+
+    # La clave primaria se agrega después de cargar: mantener el índice fila a
+    # fila durante el COPY es mucho más lento que construirlo una vez al final
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table_name} (
+            id SERIAL,
+            class INT,
+            question_title TEXT,
+            question_content TEXT,
+            best_answer TEXT
+        );
+
+        -- Un registro por bloque cargado (se inserta en la misma transacción que el COPY)
+        CREATE TABLE IF NOT EXISTS loader_checkpoints (
+            table_name TEXT NOT NULL,
+            file_key TEXT NOT NULL,
+            shard_start BIGINT NOT NULL,
+            chunk INT NOT NULL,
+            row_count INT NOT NULL,
+            loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (table_name, file_key, shard_start, chunk)
+        );
+
+        -- Un registro por shard completo: estos ni siquiera se vuelven a leer
+        CREATE TABLE IF NOT EXISTS loader_shards (
+            table_name TEXT NOT NULL,
+            file_key TEXT NOT NULL,
+            shard_start BIGINT NOT NULL,
+            shard_end BIGINT NOT NULL,
+            row_count INT NOT NULL,
+            loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (table_name, file_key, shard_start)
+        );
+    """)
+
+    if load_mode == "full":
+        cur.execute("DELETE FROM loader_checkpoints WHERE table_name = %s", (table_name,))
+        cur.execute("DELETE FROM loader_shards WHERE table_name = %s", (table_name,))
+
+
+def has_primary_key(cur):
+    cur.execute("""
+        SELECT 1 FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indrelid
+        WHERE c.relname = %s AND i.indisprimary
+    """, (table_name,))
+    return cur.fetchone() is not None
+
+
+def create_indexes(cur):
+    """Crea los índices una vez que los datos ya están cargados"""
+    if not has_primary_key(cur):
+        cur.execute(f"ALTER TABLE {table_name} ADD PRIMARY KEY (id)")
+    cur.execute(f"ANALYZE {table_name}")
+
+
+def chunk_to_csv(chunk):
+    """Convierte un bloque del CSV a un buffer listo para COPY (las 4 primeras columnas)"""
+    data = chunk.iloc[:, :4].copy()
+    data.columns = COLUMNS
+    data["class"] = data["class"].astype("int64")
+    for column in COLUMNS[1:]:
+        data[column] = data[column].fillna("").astype(str)
+
+    buffer = io.StringIO()
+    # Texto siempre entre comillas: en COPY un campo vacío sin comillas sería NULL
+    data.to_csv(buffer, index=False, header=False, quoting=csv.QUOTE_NONNUMERIC)
+    buffer.seek(0)
+    return buffer
+
+
+def copy_chunk(cur, chunk):
+    """Envía un bloque a PostgreSQL con COPY FROM STDIN"""
+    cur.copy_expert(
+        f"COPY {table_name} ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+        chunk_to_csv(chunk)
+    )
+
+
+def list_csv_files():
+    """Resuelve CSV_PATH (archivo, patrón glob o lista separada por comas)"""
+    files = []
+    for pattern in csv_path.split(","):
+        matches = sorted(glob.glob(pattern.strip()))
+        files.extend(matches if matches else [pattern.strip()])
+    return files
+
+
+def file_key(path):
+    """Identifica un archivo por nombre y tamaño, para no confundirlo con otra versión"""
+    return f"{os.path.basename(path)}:{os.path.getsize(path)}"
+
+
+def split_shards(path):
+    """Divide un archivo en rangos de bytes de ~SHARD_BYTES alineados al inicio de una línea"""
+    size = os.path.getsize(path)
+    if shard_bytes <= 0 or size <= shard_bytes:
+        return [(path, 0, size)]
+
+    boundaries = [0]
+    with open(path, "rb") as f:
+        for offset in range(shard_bytes, size, shard_bytes):
+            f.seek(offset)
+            f.readline()  # avanzar hasta el comienzo de la siguiente línea
+            aligned = f.tell()
+            if boundaries[-1] < aligned < size:
+                boundaries.append(aligned)
+    boundaries.append(size)
+
+    return [(path, boundaries[k], boundaries[k + 1]) for k in range(len(boundaries) - 1)]
+
+
+def pending_shards(cur, shards):
+    """Descarta los shards que ya quedaron completos en una carga anterior"""
+    cur.execute("SELECT file_key, shard_start FROM loader_shards WHERE table_name = %s", (table_name,))
+    done = set(cur.fetchall())
+    return [shard for shard in shards if (file_key(shard[0]), shard[1]) not in done]
+
+
+class ShardReader(io.RawIOBase):
+    """Archivo de solo lectura limitado al rango de bytes [start, end) de un shard"""
+
+    def __init__(self, path, start, end):
+        self.file = open(path, "rb")
+        self.file.seek(start)
+        self.remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self.remaining)
+        if size <= 0:
+            return 0
+        read = self.file.readinto(memoryview(buffer)[:size])
+        self.remaining -= read
+        return read
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
+def load_shard(shard):
+    """
+    Carga un shard en su propia conexión. Cada bloque se copia y se registra su
+    checkpoint en la misma transacción, así tras un reinicio se saltan los
+    bloques ya cargados sin duplicar filas.
+    """
+    path, start, end = shard
+    key = file_key(path)
+    conn = connect()
+    cur = conn.cursor()
+
+    cur.execute("""
+        SELECT chunk FROM loader_checkpoints
+        WHERE table_name = %s AND file_key = %s AND shard_start = %s
+    """, (table_name, key, start))
+    done_chunks = {row[0] for row in cur.fetchall()}
+
+    header = 0 if (start == 0 and csv_has_header) else None
+    started = time.time()
+    loaded_rows = 0
+    total_rows = 0
+
+    # El shard se lee por bloques desde el archivo, sin cargarlo completo en memoria
+    with io.BufferedReader(ShardReader(path, start, end)) as data:
+        for chunk_index, chunk in enumerate(pd.read_csv(data, chunksize=chunk_size, header=header)):
+            total_rows += len(chunk)
+            if chunk_index in done_chunks:
+                continue
+
+            copy_chunk(cur, chunk)
+            cur.execute("""
+                INSERT INTO loader_checkpoints (table_name, file_key, shard_start, chunk, row_count)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (table_name, key, start, chunk_index, len(chunk)))
+            conn.commit()
+            loaded_rows += len(chunk)
+            elapsed = time.time() - started
+            print(f"  [{os.path.basename(path)}@{start}] bloque {chunk_index}: {loaded_rows} filas "
+                  f"({loaded_rows / elapsed:.0f} filas/s)")
+
+    cur.execute("""
+        INSERT INTO loader_shards (table_name, file_key, shard_start, shard_end, row_count)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT DO NOTHING
+    """, (table_name, key, start, end, total_rows))
+    conn.commit()
+    cur.close()
+    conn.close()
+
+    return path, start, loaded_rows, time.time() - started
+
+
+def preprocess_text(text):
+    """Limpia y normaliza el texto (misma normalización que score/score_service.py)"""
+    if not text:
+        return ""
+    text = text.lower()
+    text = re.sub(r'[^\w\s]', ' ', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+
+def create_precompute_tables(cur):
+    """Tablas complementarias con el texto normalizado y las frecuencias de documento"""
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table_name}_normalized (
+            id INT PRIMARY KEY,
+            best_answer_norm TEXT,
+            tokens TEXT[],
+            token_count INT,
+            norm_length INT
+        );
+
+        CREATE TABLE IF NOT EXISTS {table_name}_df (
+            term TEXT PRIMARY KEY,
+            doc_freq INT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS {table_name}_corpus_stats (
+            key TEXT PRIMARY KEY,
+            value BIGINT NOT NULL
+        );
+    """)
+
+
+def normalized_rows_to_csv(rows):
+    """
+    Arma el buffer para COPY de (id, texto normalizado, tokens, largos) y el de
+    las frecuencias de documento (término, respuestas del bloque que lo contienen)
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    doc_freq = Counter()
+    for row_id, best_answer in rows:
+        normalized = preprocess_text(best_answer)
+        words = normalized.split()
+        unique = sorted(set(words))
+        doc_freq.update(unique)
+        # Los tokens son \w+, así que nunca contienen comillas, comas ni llaves
+        tokens = "{" + ",".join(f'"{token}"' for token in unique) + "}"
+        writer.writerow([row_id, normalized, tokens, len(words), len(normalized)])
+    buffer.seek(0)
+
+    df_buffer = io.StringIO()
+    csv.writer(df_buffer).writerows(doc_freq.items())
+    df_buffer.seek(0)
+    return buffer, df_buffer
+
+
+def precompute_scoring_data():
+    """
+    Pasada opcional posterior a la carga: normaliza cada best_answer que aún no
+    tenga fila en {tabla}_normalized (también es reanudable) y suma sus
+    frecuencias de documento a las del corpus en la misma transacción, así el
+    costo depende de las filas nuevas y no del tamaño del corpus.
+    """
+    start = time.time()
+    read_conn = connect()
+    write_conn = connect()
+    write_cur = write_conn.cursor()
+    create_precompute_tables(write_cur)
+    write_cur.execute("CREATE TEMP TABLE chunk_df (term TEXT, doc_freq INT) ON COMMIT DELETE ROWS")
+    write_conn.commit()
+
+    # Cursor del lado del servidor en una conexión aparte: lee por bloques
+    # mientras la otra conexión escribe y confirma cada bloque
+    read_cur = read_conn.cursor(name="precompute")
+    read_cur.itersize = chunk_size
+    read_cur.execute(f"""
+        SELECT a.id, a.best_answer
+        FROM {table_name} a
+        LEFT JOIN {table_name}_normalized n ON n.id = a.id
+        WHERE n.id IS NULL
+    """)
+
+    total_rows = 0
+    while True:
+        rows = read_cur.fetchmany(chunk_size)
+        if not rows:
+            break
+        normalized, doc_freq = normalized_rows_to_csv(rows)
+        write_cur.copy_expert(
+            f"COPY {table_name}_normalized (id, best_answer_norm, tokens, token_count, norm_length) "
+            f"FROM STDIN WITH (FORMAT csv)",
+            normalized
+        )
+        # Frecuencias de documento: en cuántas respuestas aparece cada término
+        write_cur.copy_expert("COPY chunk_df (term, doc_freq) FROM STDIN WITH (FORMAT csv)", doc_freq)
+        write_cur.execute(f"""
+            INSERT INTO {table_name}_df (term, doc_freq)
+            SELECT term, doc_freq FROM chunk_df
+            ON CONFLICT (term) DO UPDATE SET doc_freq = {table_name}_df.doc_freq + EXCLUDED.doc_freq
+        """)
+        write_cur.execute(f"""
+            INSERT INTO {table_name}_corpus_stats (key, value) VALUES ('total_docs', %s)
+            ON CONFLICT (key) DO UPDATE SET value = {table_name}_corpus_stats.value + EXCLUDED.value
+        """, (len(rows),))
+        write_conn.commit()
+        total_rows += len(rows)
+        elapsed = time.time() - start
+        print(f"  precálculo: {total_rows} respuestas normalizadas ({total_rows / elapsed:.0f} filas/s)")
+
+    read_cur.close()
+    read_conn.close()
+    write_cur.close()
+    write_conn.close()
+
+    print(f"Precálculo para score terminado en {time.time() - start:.2f}s ({total_rows} filas nuevas)")
+
+
+def main():
+    print(f"Conectando a PostgreSQL {host}:{port}, db={database}, tabla={table_name}")
+    print(f"Modo {load_mode}: leyendo {csv_path} en bloques de {chunk_size} filas con {workers} workers ...")
+
+    conn = connect()
+    cur = conn.cursor()
+    create_table(cur)
+    conn.commit()
+
+    shards = [shard for path in list_csv_files() for shard in split_shards(path)]
+    pending = pending_shards(cur, shards)
+    print(f"{len(shards)} shards en total, {len(shards) - len(pending)} ya cargados, {len(pending)} pendientes")
+
+    # Cargar los shards pendientes en paralelo: la memoria de cada worker queda
+    # acotada por SHARD_BYTES y CHUNK_SIZE
+    start = time.time()
+    total_rows = 0
+    if pending:
+        with Pool(processes=min(workers, len(pending))) as pool:
+            for path, shard_start, rows, shard_time in pool.imap_unordered(load_shard, pending):
+                total_rows += rows
+                elapsed = time.time() - start
+                print(f"  {os.path.basename(path)}@{shard_start}: {rows} filas en {shard_time:.2f}s "
+                      f"(total {total_rows}, {total_rows / elapsed:.0f} filas/s)")
+
+    index_start = time.time()
+    create_indexes(cur)
+    conn.commit()
+    print(f"Índices creados en {time.time() - index_start:.2f}s")
+
+    cur.close()
+    conn.close()
+
+    elapsed = time.time() - start
+    rate = total_rows / elapsed if elapsed > 0 else 0
+    print(f"✅ {total_rows} filas cargadas en la tabla {table_name} en {elapsed:.2f}s ({rate:.0f} filas/s)")
+
+    if precompute:
+        precompute_scoring_data()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark de Levenshtein: matriz DP completa (implementación anterior) vs.
+bit-paralelo de Myers, con y sin umbral de corte.
+
+Uso:
+    python benchmark_levenshtein.py [--lengths 100,1000,3000,5000] [--repeat 3]
+                                    [--max-baseline-length 3000] [--min-similarity 0.5]
+
+Verifica que ambas implementaciones den la misma similitud en cada largo.
+"""
+import argparse
+import random
+import time
+
+from levenshtein import levenshtein_similarity
+
+WORDS = (
+    "the", "answer", "question", "you", "can", "it", "is", "to", "and", "of",
+    "people", "think", "really", "good", "time", "way", "know", "because",
+    "would", "should", "water", "money", "school", "computer", "music", "love"
+)
+
+
+def full_matrix_similarity(text1, text2):
+    """Implementación anterior: matriz (m+1)x(n+1) completa en listas de Python"""
+    if not text1 or not text2:
+        return 0.0
+    m, n = len(text1), len(text2)
+    dp = [[0] * (n + 1) for _ in range(m + 1)]
+    for i in range(m + 1):
+        dp[i][0] = i
+    for j in range(n + 1):
+        dp[0][j] = j
+    for i in range(1, m + 1):
+        for j in range(1, n + 1):
+            if text1[i-1] == text2[j-1]:
+                dp[i][j] = dp[i-1][j-1]
+            else:
+                dp[i][j] = 1 + min(dp[i-1][j], dp[i][j-1], dp[i-1][j-1])
+    return max(0.0, 1 - dp[m][n] / max(m, n))
+
+
+def synthetic_text(rng, length):
+    words = []
+    size = 0
+    while size < length:
+        word = rng.choice(WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)[:length]
+
+
+def mutate(rng, text, rate=0.3):
+    """Variante parecida: reemplaza, borra o inserta una fracción de las palabras"""
+    result = []
+    for word in text.split():
+        roll = rng.random()
+        if roll < rate / 3:
+            result.append(rng.choice(WORDS))
+        elif roll < 2 * rate / 3:
+            continue
+        elif roll < rate:
+            result.extend([word, rng.choice(WORDS)])
+        else:
+            result.append(word)
+    return " ".join(result)
+
+
+def timed(fn, *args, repeat=3):
+    """Mejor tiempo de repeat ejecuciones y el último resultado"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de Levenshtein")
+    parser.add_argument("--lengths", default="100,1000,3000,5000")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-baseline-length", type=int, default=3000,
+                        help="largo máximo para correr la matriz completa (es cuadrática en memoria)")
+    parser.add_argument("--min-similarity", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'largo':>7} {'matriz (ms)':>12} {'myers (ms)':>11} {'umbral (ms)':>12} {'speedup':>8} {'similitud':>10}")
+    for length in [int(value) for value in args.lengths.split(",")]:
+        text1 = synthetic_text(rng, length)
+        text2 = mutate(rng, text1)
+
+        myers_time, similarity = timed(levenshtein_similarity, text1, text2, repeat=args.repeat)
+        threshold_time, _ = timed(levenshtein_similarity, text1, text2, args.min_similarity, repeat=args.repeat)
+
+        baseline = "-"
+        speedup = "-"
+        if length <= args.max_baseline_length:
+            baseline_time, expected = timed(full_matrix_similarity, text1, text2, repeat=1)
+            if abs(expected - similarity) > 1e-12:
+                raise SystemExit(f"❌ Similitudes distintas en largo {length}: {expected} vs {similarity}")
+            baseline = f"{baseline_time * 1000:.1f}"
+            speedup = f"{baseline_time / myers_time:.0f}x"
+
+        print(f"{length:>7} {baseline:>12} {myers_time * 1000:>11.2f} {threshold_time * 1000:>12.2f} "
+              f"{speedup:>8} {similarity:>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Benchmark de los métodos de score por tamaño de entrada.
+
+Para cada bucket de largo (por defecto 100, 1k, 5k y 20k caracteres) arma
+pares de textos y mide, por método: percentiles de latencia, pares/s y
+memoria pico (tracemalloc). El reporte queda en JSON para comparar corridas
+(--baseline imprime la razón contra un reporte anterior).
+
+Fuentes de pares:
+- synthetic: textos sintéticos y una variante con ~30% de palabras cambiadas
+- db: respuestas reales de query_results (llm_answer vs best_answer),
+  concatenadas hasta el largo del bucket
+
+Uso:
+    python benchmark_scores.py [--source synthetic|db] [--lengths 100,1000,5000,20000]
+                               [--pairs 20] [--repeat 3] [--output score_benchmark.json]
+                               [--baseline score_benchmark_anterior.json]
+"""
+import os
+
+# Medir el cálculo en sí: sin pool de procesos, sin LRU de textos y sin ajustar TF-IDF al importar
+os.environ.setdefault("SCORE_WORKERS", "0")
+os.environ.setdefault("FEATURE_CACHE_SIZE", "0")
+os.environ.setdefault("TFIDF_FIT_ON_START", "0")
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import psycopg2
+
+import score_service
+from benchmark_levenshtein import mutate, synthetic_text
+from score_service import (
+    DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME,
+    calculate_combined_score, calculate_jaccard_similarity,
+    calculate_levenshtein_similarity, calculate_tfidf_similarity,
+    minhash_from_sets, text_features
+)
+
+
+def calculate_minhash_similarity(text1, text2):
+    return minhash_from_sets(text_features(text1).token_set, text_features(text2).token_set)
+
+
+METHODS = {
+    "tfidf": calculate_tfidf_similarity,
+    "jaccard": calculate_jaccard_similarity,
+    "levenshtein": calculate_levenshtein_similarity,
+    "combined": calculate_combined_score,
+    "minhash": calculate_minhash_similarity
+}
+
+
+def synthetic_pairs(rng, length, count):
+    pairs = []
+    for _ in range(count):
+        text1 = synthetic_text(rng, length)
+        pairs.append((text1, mutate(rng, text1)[:length]))
+    return pairs
+
+
+def load_db_answers(limit=5000):
+    conn = psycopg2.connect(host=DB_HOST, port=DB_PORT, user=DB_USER, password=DB_PASSWORD, dbname=DB_NAME)
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT llm_answer, best_answer FROM query_results
+        WHERE llm_answer <> '' AND best_answer <> ''
+        ORDER BY random() LIMIT %s
+    """, (limit,))
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+    if not rows:
+        raise SystemExit("query_results no tiene pares; use --source synthetic")
+    return rows
+
+
+def db_pairs(rng, rows, length, count):
+    """Concatena pares reales hasta el largo del bucket (ambos lados en paralelo)"""
+    pairs = []
+    for _ in range(count):
+        llm_parts, best_parts = [], []
+        while sum(map(len, llm_parts)) < length or sum(map(len, best_parts)) < length:
+            llm_answer, best_answer = rng.choice(rows)
+            llm_parts.append(llm_answer)
+            best_parts.append(best_answer)
+        pairs.append((" ".join(llm_parts)[:length], " ".join(best_parts)[:length]))
+    return pairs
+
+
+def measure(fn, pairs, repeat):
+    """Latencias por llamada (s) sobre todos los pares, repeat veces"""
+    latencies = []
+    for _ in range(repeat):
+        for text1, text2 in pairs:
+            start = time.perf_counter()
+            fn(text1, text2)
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def peak_memory(fn, pairs):
+    """Memoria pico (bytes) asignada por Python durante el cálculo de un par"""
+    peak = 0
+    for text1, text2 in pairs[:3]:
+        tracemalloc.start()
+        fn(text1, text2)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return peak
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de métodos de score")
+    parser.add_argument("--source", choices=("synthetic", "db"), default="synthetic")
+    parser.add_argument("--lengths", default="100,1000,5000,20000")
+    parser.add_argument("--methods", default=",".join(METHODS))
+    parser.add_argument("--pairs", type=int, default=20, help="pares por bucket")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="score_benchmark.json")
+    parser.add_argument("--baseline", default=None, help="reporte anterior para comparar")
+    args = parser.parse_args()
+
+    # TF-IDF con el modelo del corpus si está en disco (como en el servicio)
+    score_service.load_tfidf_model()
+    tfidf_mode = "corpus" if score_service.tfidf_state["model"] is not None else "pair"
+
+    rng = random.Random(args.seed)
+    rows = load_db_answers() if args.source == "db" else None
+    methods = [name.strip() for name in args.methods.split(",")]
+
+    results = []
+    print(f"{'método':<12} {'largo':>6} {'p50 (ms)':>10} {'p90 (ms)':>10} {'p99 (ms)':>10} {'pares/s':>10} {'pico (KB)':>10}")
+    for length in [int(value) for value in args.lengths.split(",")]:
+        pairs = db_pairs(rng, rows, length, args.pairs) if rows else synthetic_pairs(rng, length, args.pairs)
+        for name in methods:
+            fn = METHODS[name]
+            fn(*pairs[0])  # calentamiento
+            latencies = np.asarray(measure(fn, pairs, args.repeat)) * 1000
+            peak = peak_memory(fn, pairs)
+            result = {
+                "method": name,
+                "length": length,
+                "samples": len(latencies),
+                "mean_ms": round(float(latencies.mean()), 4),
+                "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+                "p90_ms": round(float(np.percentile(latencies, 90)), 4),
+                "p99_ms": round(float(np.percentile(latencies, 99)), 4),
+                "max_ms": round(float(latencies.max()), 4),
+                "pairs_per_s": round(1000 / float(latencies.mean()), 2),
+                "peak_memory_bytes": peak
+            }
+            results.append(result)
+            print(f"{name:<12} {length:>6} {result['p50_ms']:>10.3f} {result['p90_ms']:>10.3f} "
+                  f"{result['p99_ms']:>10.3f} {result['pairs_per_s']:>10.1f} {peak / 1024:>10.1f}")
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "source": args.source,
+        "tfidf_mode": tfidf_mode,
+        "pairs_per_bucket": args.pairs,
+        "repeat": args.repeat,
+        "seed": args.seed,
+        "results": results
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📄 Reporte guardado en {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {(r["method"], r["length"]): r for r in json.load(f)["results"]}
+        print(f"\nComparación con {args.baseline} (p50 anterior / actual, >1 = más rápido ahora):")
+        for result in results:
+            previous = baseline.get((result["method"], result["length"]))
+            if previous and result["p50_ms"] > 0:
+                print(f"  {result['method']:<12} {result['length']:>6} {previous['p50_ms'] / result['p50_ms']:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Compara el TF-IDF ajustado por par (comportamiento anterior) con el modelo
+del corpus: tiempo de carga del modelo, latencia por request y distribución
+de scores sobre pares reales (llm_answer, best_answer) de query_results.
+
+El modelo ajustado se guarda en un directorio temporal, para no reemplazar
+el que usa el servicio; con --model-dir se guarda ahí.
+
+Uso:
+    python compare_tfidf.py [--pairs 1000] [--model-dir dir] [--output tfidf_comparison.json]
+"""
+import argparse
+import json
+import tempfile
+import time
+
+import numpy as np
+import psycopg2
+
+from score_service import DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME, preprocess_text, tfidf_pair_fit
+from tfidf_model import CorpusTfidf, fit_model
+
+
+def load_pairs(conn, limit):
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT llm_answer, best_answer FROM query_results
+        WHERE llm_answer <> '' AND best_answer <> ''
+        ORDER BY random() LIMIT %s
+    """, (limit,))
+    pairs = [(preprocess_text(llm), preprocess_text(best)) for llm, best in cur.fetchall()]
+    cur.close()
+    return pairs
+
+
+def summarize(values, scale=1.0):
+    values = np.asarray(values) * scale
+    return {
+        "mean": round(float(values.mean()), 4),
+        "std": round(float(values.std()), 4),
+        "p10": round(float(np.percentile(values, 10)), 4),
+        "p50": round(float(np.percentile(values, 50)), 4),
+        "p90": round(float(np.percentile(values, 90)), 4),
+        "p99": round(float(np.percentile(values, 99)), 4)
+    }
+
+
+def score_all(pairs, fn):
+    scores, latencies = [], []
+    for text1, text2 in pairs:
+        start = time.perf_counter()
+        scores.append(fn(text1, text2))
+        latencies.append(time.perf_counter() - start)
+    return scores, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TF-IDF por par vs. modelo del corpus")
+    parser.add_argument("--pairs", type=int, default=1000)
+    parser.add_argument("--model-dir", default=None,
+                        help="dónde guardar el modelo ajustado (por defecto, un directorio temporal)")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(host=DB_HOST, port=DB_PORT, user=DB_USER, password=DB_PASSWORD, dbname=DB_NAME)
+
+    # Arranque: ajuste desde la base de datos y carga desde disco
+    start = time.time()
+    model = fit_model(conn, preprocess_text)
+    fit_seconds = time.time() - start
+    with tempfile.TemporaryDirectory(prefix="tfidf_compare_") as temp_dir:
+        model_dir = args.model_dir or temp_dir
+        model.save(model_dir)
+        start = time.time()
+        model = CorpusTfidf.load(model_dir)
+        load_seconds = time.time() - start
+        # IDF a memoria (se cargó con mmap) antes de borrar el directorio temporal
+        model.idf = np.array(model.idf)
+
+    pairs = load_pairs(conn, args.pairs)
+    conn.close()
+    if not pairs:
+        raise SystemExit("query_results no tiene pares para comparar")
+
+    pair_scores, pair_latencies = score_all(pairs, tfidf_pair_fit)
+    corpus_scores, corpus_latencies = score_all(pairs, model.similarity)
+
+    report = {
+        "pairs": len(pairs),
+        "model": {"terms": len(model.terms), "documents": model.doc_count, "source": model.source},
+        "startup_seconds": {"fit": round(fit_seconds, 3), "load": round(load_seconds, 3)},
+        "latency_ms": {
+            "pair": summarize(pair_latencies, 1000),
+            "corpus": summarize(corpus_latencies, 1000)
+        },
+        "scores": {
+            "pair": summarize(pair_scores),
+            "corpus": summarize(corpus_scores),
+            "pearson": round(float(np.corrcoef(pair_scores, corpus_scores)[0, 1]), 4),
+            "mean_abs_diff": round(float(np.mean(np.abs(np.subtract(pair_scores, corpus_scores)))), 4)
+        }
+    }
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+def levenshtein_distance(text1: str, text2: str, max_distance=None):
+    """
+    Distancia de Levenshtein con el algoritmo bit-paralelo de Myers (variante
+    de Hyyrö): cada columna de la matriz DP se representa como vectores de
+    bits en enteros de Python, así el costo es O(n) operaciones sobre enteros
+    de len(patrón) bits y la memoria es lineal.
+
+    Con max_distance se corta apenas la distancia final no puede quedar
+    dentro del límite y se retorna None.
+    """
+    # El patrón (bits) es el texto más corto
+    if len(text1) > len(text2):
+        text1, text2 = text2, text1
+    m, n = len(text1), len(text2)
+
+    # Cota inferior trivial: la diferencia de largos
+    if max_distance is not None and n - m > max_distance:
+        return None
+    if m == 0:
+        return n
+
+    # Máscara de posiciones de cada carácter del patrón
+    peq = {}
+    for i, char in enumerate(text1):
+        peq[char] = peq.get(char, 0) | (1 << i)
+
+    mask = (1 << m) - 1
+    last = 1 << (m - 1)
+    pv = mask  # diferencias verticales +1
+    mv = 0  # diferencias verticales -1
+    score = m
+
+    for j, char in enumerate(text2):
+        eq = peq.get(char, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | ~(xh | pv)
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+
+        # La distancia final difiere de la actual en a lo más las columnas restantes
+        if max_distance is not None and score - (n - j - 1) > max_distance:
+            return None
+
+        # Fila 0 de la DP global: cada columna suma 1 (se inserta un bit en 1)
+        ph = (ph << 1) | 1
+        mh = mh << 1
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv & mask
+
+    if max_distance is not None and score > max_distance:
+        return None
+    return score
+
+
+def levenshtein_similarity(text1: str, text2: str, min_similarity: float = 0.0) -> float:
+    """
+    Similitud 1 - distancia / largo máximo sobre textos ya normalizados.
+    Con min_similarity > 0 se corta antes cuando la similitud quedaría bajo
+    ese valor y se retorna 0.0 (sobre el umbral el valor es exacto).
+    """
+    if not text1 or not text2:
+        return 0.0
+
+    max_len = max(len(text1), len(text2))
+    max_distance = None
+    if min_similarity > 0:
+        max_distance = int((1 - min_similarity) * max_len)
+
+    distance = levenshtein_distance(text1, text2, max_distance)
+    if distance is None:
+        return 0.0
+
+    # Convertir distancia a similitud (1 = idéntico, 0 = completamente diferente)
+    return max(0.0, 1 - (distance / max_len))
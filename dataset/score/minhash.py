@@ -0,0 +1,42 @@
+import hashlib
+from functools import lru_cache
+
+import numpy as np
+
+# Primo 2^31 - 1: con hashes de 32 bits, a * h + b cabe en un uint64 sin desbordar
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+@lru_cache(maxsize=100000)
+def token_hash(token: str) -> int:
+    """Hash estable de 32 bits de un token"""
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest(), "big")
+
+
+class MinHasher:
+    """
+    Firmas MinHash de tamaño fijo (num_perm) para estimar el índice de
+    Jaccard entre conjuntos de tokens sin compararlos completos: la fracción
+    de posiciones iguales entre dos firmas estima |A ∩ B| / |A ∪ B| con error
+    estándar ~ 1 / sqrt(num_perm).
+    """
+
+    def __init__(self, num_perm=128, seed=1):
+        self.num_perm = num_perm
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+        self.b = rng.randint(0, MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+
+    def signature(self, tokens):
+        """Firma de un conjunto de tokens, o None si está vacío"""
+        if not tokens:
+            return None
+        hashes = np.fromiter((token_hash(token) for token in tokens), dtype=np.uint64, count=len(tokens))
+        # Una permutación por columna: mínimo de (a * h + b) mod P sobre los tokens
+        return ((np.outer(hashes, self.a) + self.b) % MERSENNE_PRIME).min(axis=0)
+
+    @staticmethod
+    def similarity(signature1, signature2) -> float:
+        if signature1 is None or signature2 is None:
+            return 0.0
+        return float(np.count_nonzero(signature1 == signature2)) / len(signature1)
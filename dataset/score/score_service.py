@@ -1,51 +1,309 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
+from typing import List, Optional
+from functools import lru_cache
+from concurrent.futures import Future, ProcessPoolExecutor
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
-import re
+import psycopg2
+import multiprocessing
+import os
+import random
+import threading
+import time
+
+from levenshtein import levenshtein_similarity
+from minhash import MinHasher
+from text_features import FeatureCache, TextFeatures, preprocess_text
+from tfidf_model import MODEL_DIR as TFIDF_MODEL_DIR, CorpusTfidf, corpus_size, fit_model
 
 app = FastAPI()
 
+# Datos precalculados por el loader (PRECOMPUTE=1): best_answer normalizado y sus tokens
+DB_HOST = os.getenv("DB_HOST", "postgres")
+DB_PORT = os.getenv("DB_PORT", "5432")
+DB_USER = os.getenv("DB_USER", "postgres")
+DB_PASSWORD = os.getenv("DB_PASSWORD", "postgres")
+DB_NAME = os.getenv("DB_NAME", "yahoo_dataset")
+USE_PRECOMPUTED = os.getenv("USE_PRECOMPUTED", "1") == "1"
+PRECOMPUTED_TABLE = os.getenv("PRECOMPUTED_TABLE", "yahoo_answers_normalized")
+# Si la tabla no existe (PRECOMPUTE=0 o el loader aún no termina) o la base falla,
+# no se vuelve a consultar hasta pasados estos segundos
+PRECOMPUTED_RETRY_SECONDS = float(os.getenv("PRECOMPUTED_RETRY_SECONDS", "30"))
+
+SCORE_METHODS = ("tfidf", "jaccard", "levenshtein", "combined", "minhash")
+MAX_BATCH_PAIRS = int(os.getenv("MAX_BATCH_PAIRS", "10000"))  # pares por solicitud en /score/batch
+
+# Pool de procesos para el cálculo (el GIL serializa Levenshtein y las regex en hilos).
+# SCORE_WORKERS=0 calcula en el mismo proceso; sobre SCORE_QUEUE_SIZE solicitudes en curso se responde 503
+SCORE_WORKERS = int(os.getenv("SCORE_WORKERS", str(os.cpu_count() or 1)))
+SCORE_QUEUE_SIZE = int(os.getenv("SCORE_QUEUE_SIZE", str(max(1, SCORE_WORKERS) * 8)))
+
+# TF-IDF: "corpus" usa el IDF ajustado sobre yahoo_answers (ver tfidf_model.py),
+# "pair" ajusta un vectorizador con los dos textos de cada request (comportamiento anterior)
+TFIDF_MODE = os.getenv("TFIDF_MODE", "corpus")
+TFIDF_FIT_ON_START = os.getenv("TFIDF_FIT_ON_START", "1") == "1"  # ajustar y guardar si no hay modelo o el corpus cambió
+
+# LRU de textos normalizados y tokens por hash del texto (uno por proceso del pool)
+FEATURE_CACHE_SIZE = int(os.getenv("FEATURE_CACHE_SIZE", "5000"))
+
+# Jaccard aproximado con MinHash: tamaño de la firma y fracción de requests
+# que además calculan el Jaccard exacto para medir el error
+MINHASH_PERMUTATIONS = int(os.getenv("MINHASH_PERMUTATIONS", "128"))
+MINHASH_SEED = int(os.getenv("MINHASH_SEED", "1"))
+MINHASH_CHECK_RATE = float(os.getenv("MINHASH_CHECK_RATE", "0.05"))
+
+# Levenshtein: con un umbral > 0 se corta antes y las similitudes menores se reportan como 0.0
+LEVENSHTEIN_MIN_SIMILARITY = float(os.getenv("LEVENSHTEIN_MIN_SIMILARITY", "0"))
+
 # Modelo para la request
 class ScoreRequest(BaseModel):
     llm_answer: str
     best_answer: str
     method: str = "tfidf"  # Opciones: "tfidf", "jaccard", "levenshtein"
+    # Si se indica, best_answer es el de yahoo_answers con ese id y se usa su versión precalculada
+    question_id: Optional[int] = None
 
 
-def preprocess_text(text: str) -> str:
-    """Limpia y normaliza el texto"""
-    if not text:
-        return ""
-    
-    # Convertir a minúsculas
-    text = text.lower()
-    
-    # Remover puntuación extra
-    text = re.sub(r'[^\w\s]', ' ', text)
-    
-    # Remover espacios múltiples
-    text = re.sub(r'\s+', ' ', text)
-    
-    return text.strip()
+class ScorePair(BaseModel):
+    llm_answer: str
+    best_answer: str
+    question_id: Optional[int] = None
 
 
-def calculate_tfidf_similarity(text1: str, text2: str) -> float:
+class ScoreBatchRequest(BaseModel):
+    pairs: List[ScorePair]
+    method: str = "combined"
+
+
+def text_features(text: str) -> TextFeatures:
+    """Texto normalizado y tokens, desde el LRU del proceso si el texto ya se vio"""
+    return feature_cache.get(text)
+
+
+precomputed_db = {"conn": None, "table_ready": False, "unavailable_until": 0.0}
+tfidf_state = {"model": None, "load_seconds": None, "error": None}
+pool_state = {"executor": None, "pending": 0, "rejected": 0, "lock": threading.Lock()}
+method_timings = {}  # método -> conteo, suma y máximo del cálculo y de la espera en cola
+feature_cache = FeatureCache(FEATURE_CACHE_SIZE)
+feature_stats = {"hits": 0, "misses": 0}  # sumados desde todos los procesos
+minhasher = MinHasher(MINHASH_PERMUTATIONS, seed=MINHASH_SEED)
+minhash_stats = {"checked": 0, "abs_error_sum": 0.0, "max_abs_error": 0.0}
+
+
+def get_precomputed_connection():
+    """Conexión perezosa a la base de datos con los datos precalculados"""
+    conn = precomputed_db["conn"]
+    if conn is None or conn.closed:
+        conn = psycopg2.connect(
+            host=DB_HOST,
+            port=DB_PORT,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            dbname=DB_NAME
+        )
+        conn.autocommit = True
+        precomputed_db["conn"] = conn
+    return conn
+
+
+def discard_precomputed_connection():
+    """Cierra la conexión (si quedó abierta) para que la próxima se cree de nuevo"""
+    conn = precomputed_db["conn"]
+    precomputed_db["conn"] = None
+    precomputed_db["table_ready"] = False
+    if conn is not None and not conn.closed:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+@lru_cache(maxsize=10000)
+def load_precomputed_best_answer(question_id: int):
+    """Lee (texto normalizado, tokens) de la tabla precalculada; None si no hay fila"""
+    cur = get_precomputed_connection().cursor()
+    cur.execute(f"""
+        SELECT best_answer_norm, tokens FROM {PRECOMPUTED_TABLE} WHERE id = %s
+    """, (question_id,))
+    row = cur.fetchone()
+    cur.close()
+
+    if row is None:
+        return None
+    return row[0], frozenset(row[1] or ())
+
+
+def get_precomputed_best_answer(question_id: int):
     """
-    Calcula similitud usando TF-IDF y cosine similarity.
-    Captura similitud semántica basada en términos importantes.
+    Retorna (texto normalizado, conjunto de tokens) del best_answer precalculado,
+    o None si no existe o la base de datos no responde: en ese caso se recalcula.
+    Los errores no quedan en caché: se reintenta pasados PRECOMPUTED_RETRY_SECONDS.
     """
-    if not text1 or not text2:
-        return 0.0
-    
-    # Preprocesar textos
-    text1 = preprocess_text(text1)
-    text2 = preprocess_text(text2)
-    
-    if not text1 or not text2:
-        return 0.0
-    
+    if time.monotonic() < precomputed_db["unavailable_until"]:
+        return None
+    try:
+        if not precomputed_db["table_ready"]:
+            cur = get_precomputed_connection().cursor()
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL", (PRECOMPUTED_TABLE,))
+            exists = cur.fetchone()[0]
+            cur.close()
+            if not exists:
+                print(f"Tabla {PRECOMPUTED_TABLE} no existe, se recalcula el best_answer "
+                      f"(se revisa de nuevo en {PRECOMPUTED_RETRY_SECONDS:.0f}s)")
+                precomputed_db["unavailable_until"] = time.monotonic() + PRECOMPUTED_RETRY_SECONDS
+                return None
+            precomputed_db["table_ready"] = True
+        return load_precomputed_best_answer(question_id)
+    except Exception as e:
+        print(f"Datos precalculados no disponibles: {e}")
+        discard_precomputed_connection()
+        precomputed_db["unavailable_until"] = time.monotonic() + PRECOMPUTED_RETRY_SECONDS
+        return None
+
+
+def refit_if_stale(model):
+    """
+    Compara el tamaño del corpus con el que se ajustó el modelo guardado y, si
+    difiere (o no hay modelo), lo ajusta de nuevo y lo guarda. Así un modelo
+    ajustado mientras el loader aún cargaba no queda fijo para siempre.
+    """
+    conn = get_precomputed_connection()
+    conn.autocommit = False
+    try:
+        current = corpus_size(conn)
+        if model is not None and model.corpus_docs == current:
+            return model
+        if model is not None:
+            print(f"⚠️ Modelo TF-IDF ajustado con un corpus de {model.corpus_docs} documentos, "
+                  f"ahora tiene {current}: se vuelve a ajustar")
+        model = fit_model(conn, preprocess_text)
+    finally:
+        conn.rollback()
+        conn.autocommit = True
+    model.save(TFIDF_MODEL_DIR)
+    return model
+
+
+def load_tfidf_model():
+    """
+    Carga el modelo TF-IDF del corpus desde disco. Con TFIDF_FIT_ON_START=1
+    lo ajusta desde la base de datos y lo guarda si no existe o si el corpus
+    cambió desde el ajuste. Si nada de eso funciona se sigue con el ajuste
+    por par de textos.
+    """
+    start = time.time()
+    try:
+        model = None
+        if os.path.exists(os.path.join(TFIDF_MODEL_DIR, "idf.npy")):
+            model = CorpusTfidf.load(TFIDF_MODEL_DIR)
+        if TFIDF_FIT_ON_START:
+            try:
+                model = refit_if_stale(model)
+            except Exception as e:
+                if model is None:
+                    raise
+                discard_precomputed_connection()
+                print(f"⚠️ No se pudo verificar el corpus ({e}), se usa el modelo guardado")
+        elif model is None:
+            raise RuntimeError(f"No hay modelo en {TFIDF_MODEL_DIR}")
+    except Exception as e:
+        tfidf_state["error"] = str(e)
+        discard_precomputed_connection()
+        print(f"⚠️ Modelo TF-IDF del corpus no disponible ({e}), se ajusta por par de textos")
+        return
+
+    tfidf_state["model"] = model
+    tfidf_state["load_seconds"] = round(time.time() - start, 3)
+    print(f"✅ Modelo TF-IDF: {len(model.terms)} términos de {model.doc_count} documentos "
+          f"({model.source}) en {tfidf_state['load_seconds']}s")
+
+
+def init_worker():
+    """Al hacer fork todos los workers heredan el mismo estado de random: se resiembra
+    cada uno para que el muestreo de MINHASH_CHECK_RATE sea independiente"""
+    random.seed(os.getpid() ^ time.time_ns())
+
+
+@app.on_event("startup")
+def startup():
+    if TFIDF_MODE == "corpus":
+        load_tfidf_model()
+    if SCORE_WORKERS > 0:
+        # fork después de cargar el modelo: los workers lo heredan sin volver a leerlo.
+        # Las consultas a la base de datos quedan en el proceso principal.
+        executor = ProcessPoolExecutor(max_workers=SCORE_WORKERS,
+                                       mp_context=multiprocessing.get_context("fork"),
+                                       initializer=init_worker)
+        executor.submit(int).result()  # crea los workers ahora y no en la primera request
+        pool_state["executor"] = executor
+        print(f"✅ Pool de score: {SCORE_WORKERS} procesos, hasta {SCORE_QUEUE_SIZE} solicitudes en curso")
+
+
+@app.on_event("shutdown")
+def shutdown():
+    if pool_state["executor"] is not None:
+        pool_state["executor"].shutdown(wait=False, cancel_futures=True)
+
+
+def timed_call(fn, args):
+    """Se ejecuta en el worker: resultado, segundos de cálculo y (aciertos, fallos) del LRU de textos"""
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start, feature_cache.take_delta()
+
+
+def submit_scoring(fn, *args) -> Future:
+    """Envía un cálculo al pool (o lo hace aquí mismo si SCORE_WORKERS=0)"""
+    executor = pool_state["executor"]
+    if executor is not None:
+        return executor.submit(timed_call, fn, args)
+    future = Future()
+    future.set_result(timed_call(fn, args))
+    return future
+
+
+def record_timing(method: str, compute: float, wait: float):
+    with pool_state["lock"]:
+        timing = method_timings.setdefault(method, {"count": 0, "compute_sum": 0.0, "compute_max": 0.0, "wait_sum": 0.0})
+        timing["count"] += 1
+        timing["compute_sum"] += compute
+        timing["compute_max"] = max(timing["compute_max"], compute)
+        timing["wait_sum"] += wait
+
+
+def run_scoring(method: str, futures_args):
+    """
+    Ejecuta uno o más cálculos en el pool con contrapresión: si ya hay
+    SCORE_QUEUE_SIZE solicitudes en curso se responde 503 en vez de encolar
+    sin límite. futures_args es una lista de (fn, *args); retorna sus resultados.
+    """
+    with pool_state["lock"]:
+        if pool_state["pending"] >= SCORE_QUEUE_SIZE:
+            pool_state["rejected"] += 1
+            raise HTTPException(status_code=503, detail="Servicio de score saturado, reintente más tarde")
+        pool_state["pending"] += 1
+
+    try:
+        start = time.perf_counter()
+        futures = [submit_scoring(fn, *args) for fn, *args in futures_args]
+        outcomes = [future.result() for future in futures]
+        elapsed = time.perf_counter() - start
+        compute = sum(seconds for _, seconds, _ in outcomes)
+        record_timing(method, compute, max(0.0, elapsed - max(seconds for _, seconds, _ in outcomes)))
+        with pool_state["lock"]:
+            for _, _, (hits, misses) in outcomes:
+                feature_stats["hits"] += hits
+                feature_stats["misses"] += misses
+        return [result for result, _, _ in outcomes]
+    finally:
+        with pool_state["lock"]:
+            pool_state["pending"] -= 1
+
+
+def tfidf_pair_fit(text1: str, text2: str) -> float:
+    """Comportamiento anterior: TfidfVectorizer ajustado solo con los dos textos"""
     try:
         # Vectorizar usando TF-IDF
         vectorizer = TfidfVectorizer()
@@ -61,18 +319,31 @@ def calculate_tfidf_similarity(text1: str, text2: str) -> float:
         return 0.0
 
 
-def calculate_jaccard_similarity(text1: str, text2: str) -> float:
+def tfidf_from_normalized(text1: str, text2: str) -> float:
+    """TF-IDF + coseno sobre textos ya normalizados (IDF del corpus si hay modelo)"""
+    if not text1 or not text2:
+        return 0.0
+
+    model = tfidf_state["model"]
+    if model is None:
+        return tfidf_pair_fit(text1, text2)
+    return model.similarity(text1, text2)
+
+
+def calculate_tfidf_similarity(text1: str, text2: str) -> float:
     """
-    Calcula índice de Jaccard basado en conjuntos de palabras.
-    Mide superposición de vocabulario.
+    Calcula similitud usando TF-IDF y cosine similarity.
+    Captura similitud semántica basada en términos importantes.
     """
     if not text1 or not text2:
         return 0.0
     
-    # Preprocesar y tokenizar
-    words1 = set(preprocess_text(text1).split())
-    words2 = set(preprocess_text(text2).split())
-    
+    # Preprocesar textos
+    return tfidf_from_normalized(text_features(text1).normalized, text_features(text2).normalized)
+
+
+def jaccard_from_sets(words1, words2) -> float:
+    """Índice de Jaccard sobre conjuntos de tokens ya calculados"""
     if not words1 or not words2:
         return 0.0
     
@@ -86,54 +357,76 @@ def calculate_jaccard_similarity(text1: str, text2: str) -> float:
     return intersection / union
 
 
-def calculate_levenshtein_similarity(text1: str, text2: str) -> float:
+def calculate_jaccard_similarity(text1: str, text2: str) -> float:
     """
-    Calcula similitud basada en distancia de Levenshtein normalizada.
-    Mide similitud a nivel de caracteres.
+    Calcula índice de Jaccard basado en conjuntos de palabras.
+    Mide superposición de vocabulario.
     """
     if not text1 or not text2:
         return 0.0
     
-    text1 = preprocess_text(text1)
-    text2 = preprocess_text(text2)
-    
+    # Preprocesar y tokenizar
+    return jaccard_from_sets(text_features(text1).token_set, text_features(text2).token_set)
+
+
+def calculate_levenshtein_similarity(text1: str, text2: str) -> float:
+    """
+    Calcula similitud basada en distancia de Levenshtein normalizada.
+    Mide similitud a nivel de caracteres.
+    """
     if not text1 or not text2:
         return 0.0
     
-    # Implementación de distancia de Levenshtein
-    m, n = len(text1), len(text2)
-    dp = [[0] * (n + 1) for _ in range(m + 1)]
-    
-    for i in range(m + 1):
-        dp[i][0] = i
-    for j in range(n + 1):
-        dp[0][j] = j
-    
-    for i in range(1, m + 1):
-        for j in range(1, n + 1):
-            if text1[i-1] == text2[j-1]:
-                dp[i][j] = dp[i-1][j-1]
-            else:
-                dp[i][j] = 1 + min(dp[i-1][j], dp[i][j-1], dp[i-1][j-1])
-    
-    distance = dp[m][n]
-    max_len = max(len(text1), len(text2))
-    
-    if max_len == 0:
-        return 1.0
-    
-    # Convertir distancia a similitud (1 = idéntico, 0 = completamente diferente)
-    similarity = 1 - (distance / max_len)
-    return max(0.0, similarity)
+    return levenshtein_from_normalized(text_features(text1).normalized, text_features(text2).normalized)
+
+
+def levenshtein_from_normalized(text1: str, text2: str) -> float:
+    """
+    Similitud de Levenshtein normalizada sobre textos ya normalizados.
+    Usa el algoritmo bit-paralelo de Myers (ver levenshtein.py): memoria
+    lineal y los mismos valores que la matriz DP completa.
+    """
+    return levenshtein_similarity(text1, text2, LEVENSHTEIN_MIN_SIMILARITY)
+
+
+@lru_cache(maxsize=FEATURE_CACHE_SIZE)
+def tokens_signature(tokens: frozenset):
+    """
+    Firma MinHash de un conjunto de tokens. Queda en caché: el best_answer de
+    una pregunta repetida (o precalculado) no se vuelve a firmar.
+    """
+    return minhasher.signature(tokens)
+
+
+def minhash_from_sets(words1, words2) -> float:
+    """Jaccard estimado comparando firmas MinHash de tamaño fijo"""
+    return MinHasher.similarity(tokens_signature(frozenset(words1)), tokens_signature(frozenset(words2)))
+
+
+def record_minhash_error(scores: dict):
+    """Acumula el error frente al Jaccard exacto cuando la request fue muestreada"""
+    if "jaccard" not in scores:
+        return
+    error = abs(scores["minhash"] - scores["jaccard"])
+    with pool_state["lock"]:
+        minhash_stats["checked"] += 1
+        minhash_stats["abs_error_sum"] += error
+        minhash_stats["max_abs_error"] = max(minhash_stats["max_abs_error"], error)
 
 
 def calculate_combined_score(text1: str, text2: str) -> dict:
     """
     Calcula múltiples métricas y retorna un score combinado.
     """
-    tfidf_score = calculate_tfidf_similarity(text1, text2)
-    jaccard_score = calculate_jaccard_similarity(text1, text2)
-    levenshtein_score = calculate_levenshtein_similarity(text1, text2)
+    if not text1 or not text2:
+        return {"tfidf": 0.0, "jaccard": 0.0, "levenshtein": 0.0, "combined": 0.0}
+
+    # Cada texto se normaliza y tokeniza una sola vez para las tres métricas
+    features1 = text_features(text1)
+    features2 = text_features(text2)
+    tfidf_score = tfidf_from_normalized(features1.normalized, features2.normalized)
+    jaccard_score = jaccard_from_sets(features1.token_set, features2.token_set)
+    levenshtein_score = levenshtein_from_normalized(features1.normalized, features2.normalized)
     
     # Score combinado (promedio ponderado)
     # TF-IDF tiene más peso porque captura mejor similitud semántica
@@ -147,6 +440,79 @@ def calculate_combined_score(text1: str, text2: str) -> dict:
     }
 
 
+def score_with_precomputed(llm_answer: str, best_norm: str, best_tokens, method: str) -> dict:
+    """
+    Calcula las métricas usando el best_answer precalculado por el loader:
+    solo se normaliza la respuesta del LLM (una vez para todas las métricas).
+    """
+    llm = text_features(llm_answer)
+    return score_batch([llm.normalized], [llm.token_set], [best_norm], [best_tokens], method)[0]
+
+
+def score_batch(llm_norms, llm_token_sets, best_norms, best_token_sets, method: str):
+    """
+    Métricas de muchos pares de textos ya normalizados. TF-IDF con el modelo
+    del corpus se calcula como una sola operación sobre matrices dispersas;
+    Jaccard y Levenshtein recorren los pares.
+    """
+    count = len(llm_norms)
+    scores = [{} for _ in range(count)]
+
+    if method in ("tfidf", "combined"):
+        model = tfidf_state["model"]
+        if model is not None:
+            values = model.pairwise_similarity(llm_norms, best_norms)
+        else:
+            values = [tfidf_from_normalized(a, b) for a, b in zip(llm_norms, best_norms)]
+        for position in range(count):
+            scores[position]["tfidf"] = float(values[position])
+    if method in ("jaccard", "combined"):
+        for position in range(count):
+            scores[position]["jaccard"] = jaccard_from_sets(llm_token_sets[position], best_token_sets[position])
+    if method in ("levenshtein", "combined"):
+        for position in range(count):
+            scores[position]["levenshtein"] = levenshtein_from_normalized(llm_norms[position], best_norms[position])
+    if method == "minhash":
+        for position in range(count):
+            scores[position]["minhash"] = minhash_from_sets(llm_token_sets[position], best_token_sets[position])
+            # Muestra para medir el error contra el Jaccard exacto
+            if random.random() < MINHASH_CHECK_RATE:
+                scores[position]["jaccard"] = jaccard_from_sets(llm_token_sets[position], best_token_sets[position])
+    if method == "combined":
+        for pair_scores in scores:
+            pair_scores["combined"] = (0.5 * pair_scores["tfidf"]) + (0.3 * pair_scores["jaccard"]) + (0.2 * pair_scores["levenshtein"])
+
+    return [{name: round(value, 4) for name, value in pair_scores.items()} for pair_scores in scores]
+
+
+def score_pairs(llm_answers, best_answers, precomputed, method: str):
+    """
+    Normaliza y puntúa un bloque de pares (se ejecuta en un worker del pool).
+    precomputed trae (texto normalizado, tokens) del best_answer o None.
+    """
+    llm_features = [text_features(text) for text in llm_answers]
+    best_norms, best_token_sets = [], []
+    for best_answer, stored in zip(best_answers, precomputed):
+        if stored is not None:
+            best_norm, best_tokens = stored
+        else:
+            features = text_features(best_answer)
+            best_norm, best_tokens = features.normalized, features.token_set
+        best_norms.append(best_norm)
+        best_token_sets.append(best_tokens)
+    return score_batch([f.normalized for f in llm_features], [f.token_set for f in llm_features],
+                       best_norms, best_token_sets, method)
+
+
+def add_minhash_details(response: dict, scores: dict):
+    """Tamaño de la firma y, si la request se muestreó, el Jaccard exacto y el error"""
+    response["num_perm"] = MINHASH_PERMUTATIONS
+    if "jaccard" in scores:
+        response["exact_jaccard"] = scores["jaccard"]
+        response["error"] = round(abs(scores["minhash"] - scores["jaccard"]), 4)
+    record_minhash_error(scores)
+
+
 @app.get("/health")
 def health():
     """Health check endpoint"""
@@ -172,8 +538,29 @@ def calculate_score(request: ScoreRequest):
         if not llm_answer or not best_answer:
             raise HTTPException(status_code=400, detail="Ambas respuestas deben ser no vacías")
         
+        precomputed = None
+        if USE_PRECOMPUTED and request.question_id is not None and method in SCORE_METHODS:
+            precomputed = get_precomputed_best_answer(request.question_id)
+        
+        if precomputed is not None:
+            scores = run_scoring(method, [(score_with_precomputed, llm_answer, precomputed[0], precomputed[1], method)])[0]
+            response = {
+                "method": method,
+                "precomputed": True,
+                "llm_answer_length": len(llm_answer),
+                "best_answer_length": len(best_answer)
+            }
+            if method == "combined":
+                response["scores"] = scores
+                response["recommended_score"] = scores["combined"]
+            else:
+                response["score"] = scores[method]
+            if method == "minhash":
+                add_minhash_details(response, scores)
+            return response
+        
         if method == "tfidf":
-            score = calculate_tfidf_similarity(llm_answer, best_answer)
+            score = run_scoring(method, [(calculate_tfidf_similarity, llm_answer, best_answer)])[0]
             return {
                 "score": round(score, 4),
                 "method": "tfidf",
@@ -182,7 +569,7 @@ def calculate_score(request: ScoreRequest):
             }
         
         elif method == "jaccard":
-            score = calculate_jaccard_similarity(llm_answer, best_answer)
+            score = run_scoring(method, [(calculate_jaccard_similarity, llm_answer, best_answer)])[0]
             return {
                 "score": round(score, 4),
                 "method": "jaccard",
@@ -191,7 +578,7 @@ def calculate_score(request: ScoreRequest):
             }
         
         elif method == "levenshtein":
-            score = calculate_levenshtein_similarity(llm_answer, best_answer)
+            score = run_scoring(method, [(calculate_levenshtein_similarity, llm_answer, best_answer)])[0]
             return {
                 "score": round(score, 4),
                 "method": "levenshtein",
@@ -199,8 +586,19 @@ def calculate_score(request: ScoreRequest):
                 "best_answer_length": len(best_answer)
             }
         
+        elif method == "minhash":
+            scores = run_scoring(method, [(score_pairs, [llm_answer], [best_answer], [None], method)])[0][0]
+            response = {
+                "score": scores["minhash"],
+                "method": "minhash",
+                "llm_answer_length": len(llm_answer),
+                "best_answer_length": len(best_answer)
+            }
+            add_minhash_details(response, scores)
+            return response
+        
         elif method == "combined":
-            scores = calculate_combined_score(llm_answer, best_answer)
+            scores = run_scoring(method, [(calculate_combined_score, llm_answer, best_answer)])[0]
             return {
                 "scores": scores,
                 "method": "combined",
@@ -210,7 +608,7 @@ def calculate_score(request: ScoreRequest):
             }
         
         else:
-            raise HTTPException(status_code=400, detail=f"Método desconocido: {method}. Use: tfidf, jaccard, levenshtein, o combined")
+            raise HTTPException(status_code=400, detail=f"Método desconocido: {method}. Use: tfidf, jaccard, levenshtein, minhash, o combined")
     
     except HTTPException:
         raise
@@ -218,6 +616,117 @@ def calculate_score(request: ScoreRequest):
         raise HTTPException(status_code=500, detail=f"Error calculando score: {str(e)}")
 
 
+@app.get("/tfidf")
+def tfidf_info():
+    """Estado del modelo TF-IDF usado por el servicio"""
+    model = tfidf_state["model"]
+    if model is None:
+        return {"mode": "pair", "requested_mode": TFIDF_MODE, "error": tfidf_state["error"]}
+    return {
+        "mode": "corpus",
+        "terms": len(model.terms),
+        "documents": model.doc_count,
+        "source": model.source,
+        "load_seconds": tfidf_state["load_seconds"]
+    }
+
+
+@app.post("/score/batch")
+def calculate_score_batch(request: ScoreBatchRequest):
+    """
+    Calcula el score de muchos pares en una solicitud (backfills, re-scoring
+    de query_results). Retorna un resultado por par, en el mismo orden, con
+    su propio error si el par no es válido, y el rendimiento en pares/s.
+    """
+    method = request.method.lower()
+    if method not in SCORE_METHODS:
+        raise HTTPException(status_code=400, detail=f"Método desconocido: {method}. Use: {', '.join(SCORE_METHODS)}")
+    if len(request.pairs) > MAX_BATCH_PAIRS:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_BATCH_PAIRS} pares por solicitud")
+
+    try:
+        start = time.perf_counter()
+        valid = []
+        llm_answers, best_answers, precomputed = [], [], []
+        for position, pair in enumerate(request.pairs):
+            if not pair.llm_answer or not pair.best_answer:
+                continue
+            stored = None
+            if USE_PRECOMPUTED and pair.question_id is not None:
+                stored = get_precomputed_best_answer(pair.question_id)
+            valid.append(position)
+            llm_answers.append(pair.llm_answer)
+            best_answers.append(pair.best_answer)
+            precomputed.append(stored)
+
+        # Un bloque por worker: la normalización y las métricas corren en paralelo
+        chunk = max(1, -(-len(valid) // max(1, SCORE_WORKERS)))
+        tasks = [
+            (score_pairs, llm_answers[i:i + chunk], best_answers[i:i + chunk], precomputed[i:i + chunk], method)
+            for i in range(0, len(valid), chunk)
+        ]
+        scored = [scores for block in run_scoring(f"batch_{method}", tasks) for scores in block] if tasks else []
+
+        results = [{"error": "Ambas respuestas deben ser no vacías"} for _ in request.pairs]
+        for position, scores in zip(valid, scored):
+            if method == "combined":
+                results[position] = {"scores": scores, "recommended_score": scores["combined"]}
+            else:
+                results[position] = {"score": scores[method]}
+            if method == "minhash":
+                record_minhash_error(scores)
+
+        elapsed = time.perf_counter() - start
+        return {
+            "method": method,
+            "count": len(results),
+            "results": results,
+            "elapsed_ms": round(elapsed * 1000, 3),
+            "pairs_per_s": round(len(valid) / elapsed, 1) if elapsed > 0 else 0.0
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error calculando scores: {str(e)}")
+
+
+@app.get("/stats")
+def get_stats():
+    """Estado del pool de cálculo y tiempos por método (cálculo en el worker y espera)"""
+    with pool_state["lock"]:
+        lookups = feature_stats["hits"] + feature_stats["misses"]
+        timings = {
+            method: {
+                "count": timing["count"],
+                "compute_mean_ms": round(timing["compute_sum"] / timing["count"] * 1000, 3),
+                "compute_max_ms": round(timing["compute_max"] * 1000, 3),
+                "wait_mean_ms": round(timing["wait_sum"] / timing["count"] * 1000, 3)
+            }
+            for method, timing in method_timings.items()
+        }
+        return {
+            "workers": SCORE_WORKERS if pool_state["executor"] is not None else 0,
+            "queue_size": SCORE_QUEUE_SIZE,
+            "pending": pool_state["pending"],
+            "rejected": pool_state["rejected"],
+            "methods": timings,
+            "minhash": {
+                "num_perm": MINHASH_PERMUTATIONS,
+                "checked": minhash_stats["checked"],
+                "mean_abs_error": round(minhash_stats["abs_error_sum"] / minhash_stats["checked"], 4)
+                if minhash_stats["checked"] else None,
+                "max_abs_error": round(minhash_stats["max_abs_error"], 4)
+            },
+            "feature_cache": {
+                "max_entries_per_process": FEATURE_CACHE_SIZE,
+                "hits": feature_stats["hits"],
+                "misses": feature_stats["misses"],
+                "hit_rate": round(feature_stats["hits"] / lookups, 4) if lookups else 0.0
+            }
+        }
+
+
 @app.get("/methods")
 def get_methods():
     """Retorna información sobre los métodos disponibles"""
@@ -241,6 +750,13 @@ def get_methods():
                 "range": "0.0 - 1.0",
                 "recommended": False
             },
+            "minhash": {
+                "name": "MinHash (Jaccard aproximado)",
+                "description": f"Estima el índice de Jaccard con firmas de {MINHASH_PERMUTATIONS} permutaciones; "
+                               f"costo constante por comparación, error estándar ~{1 / MINHASH_PERMUTATIONS ** 0.5:.3f}",
+                "range": "0.0 - 1.0",
+                "recommended": False
+            },
             "combined": {
                 "name": "Combined Score",
                 "description": "Promedio ponderado de las tres métricas (50% TF-IDF, 30% Jaccard, 20% Levenshtein)",
@@ -0,0 +1,76 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+
+def preprocess_text(text: str) -> str:
+    """Limpia y normaliza el texto"""
+    if not text:
+        return ""
+    
+    # Convertir a minúsculas
+    text = text.lower()
+    
+    # Remover puntuación extra
+    text = re.sub(r'[^\w\s]', ' ', text)
+    
+    # Remover espacios múltiples
+    text = re.sub(r'\s+', ' ', text)
+    
+    return text.strip()
+
+
+class TextFeatures:
+    """Texto normalizado, lista de tokens y conjunto de tokens, calculados una sola vez"""
+
+    __slots__ = ("normalized", "tokens", "token_set")
+
+    def __init__(self, text: str):
+        self.normalized = preprocess_text(text)
+        self.tokens = self.normalized.split()
+        self.token_set = frozenset(self.tokens)
+
+
+class FeatureCache:
+    """
+    LRU acotado de TextFeatures indexado por el hash del texto original, para
+    no repetir las regex cuando el mismo best_answer vuelve en otra request.
+    Cada proceso del pool tiene el suyo; take_delta() entrega los aciertos y
+    fallos desde la última llamada para sumarlos en el proceso principal.
+    """
+
+    def __init__(self, max_entries=5000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reported = (0, 0)
+
+    def get(self, text: str) -> TextFeatures:
+        if self.max_entries <= 0:
+            return TextFeatures(text)
+
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        with self.lock:
+            features = self.entries.get(key)
+            if features is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return features
+            self.misses += 1
+
+        features = TextFeatures(text)
+        with self.lock:
+            self.entries[key] = features
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return features
+
+    def take_delta(self):
+        """(aciertos, fallos) desde la llamada anterior"""
+        with self.lock:
+            hits, misses = self.hits - self.reported[0], self.misses - self.reported[1]
+            self.reported = (self.hits, self.misses)
+        return hits, misses
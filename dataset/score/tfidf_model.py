@@ -0,0 +1,182 @@
+"""
+Modelo TF-IDF ajustado sobre el corpus de yahoo_answers.
+
+En vez de ajustar un TfidfVectorizer con solo los dos textos de cada
+request (un IDF de dos documentos no dice nada), el IDF se calcula una vez
+sobre el corpus y se persiste:
+- vocabulary.txt: un término por línea (la línea es la columna del vector)
+- idf.npy: pesos IDF, se cargan con mmap
+- meta.txt: documentos del ajuste, fuente y tamaño del corpus al ajustar
+  (si el corpus cambió, por ejemplo porque el loader no había terminado,
+  el servicio vuelve a ajustar al iniciar)
+
+Fuentes del ajuste: la tabla {tabla}_df que deja el loader con PRECOMPUTE=1
+(frecuencias de documento de todo el corpus) o, si no existe, una muestra
+de best_answer normalizados.
+
+Uso offline:
+    python tfidf_model.py fit [directorio]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import psycopg2
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.preprocessing import normalize
+
+TABLE_NAME = os.getenv("TFIDF_SOURCE_TABLE", "yahoo_answers")
+MODEL_DIR = os.getenv("TFIDF_MODEL_DIR", "/app/models/tfidf")
+MIN_DF = int(os.getenv("TFIDF_MIN_DF", "2"))  # términos en menos documentos se descartan
+MAX_FEATURES = int(os.getenv("TFIDF_MAX_FEATURES", "500000"))  # los más frecuentes
+FIT_SAMPLE = int(os.getenv("TFIDF_FIT_SAMPLE", "200000"))  # filas si hay que contar desde el corpus
+
+
+class CorpusTfidf:
+    """
+    Vectorizador con vocabulario e IDF fijos: por request solo se cuentan
+    términos y se multiplica por el IDF. Usa la misma tokenización que el
+    TfidfVectorizer por defecto (\\b\\w\\w+\\b) y el IDF suavizado de sklearn.
+    """
+
+    def __init__(self, terms, idf, doc_count, source, corpus_docs=None):
+        self.terms = terms
+        self.idf = idf
+        self.doc_count = doc_count
+        self.source = source
+        self.corpus_docs = corpus_docs  # corpus_size() al momento del ajuste
+        self.counter = CountVectorizer(vocabulary={term: i for i, term in enumerate(terms)})
+
+    def transform(self, texts):
+        """Matriz dispersa TF-IDF normalizada (L2), una fila por texto"""
+        matrix = self.counter.transform(texts).astype(np.float64)
+        # Peso de cada término presente: tf * idf de su columna
+        matrix.data *= self.idf[matrix.indices]
+        return normalize(matrix)
+
+    def similarity(self, text1, text2):
+        """Coseno entre dos textos ya normalizados"""
+        matrix = self.transform([text1, text2])
+        return float(matrix[0].dot(matrix[1].T).sum())
+
+    def pairwise_similarity(self, texts1, texts2):
+        """Coseno fila a fila entre dos listas de textos, en una sola operación dispersa"""
+        matrix1 = self.transform(texts1)
+        matrix2 = self.transform(texts2)
+        return np.asarray(matrix1.multiply(matrix2).sum(axis=1)).ravel()
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "vocabulary.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(self.terms))
+        np.save(os.path.join(directory, "idf.npy"), np.asarray(self.idf, dtype=np.float64))
+        with open(os.path.join(directory, "meta.txt"), "w") as f:
+            f.write(f"{self.doc_count}\n{self.source}\n{self.corpus_docs}\n")
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, "vocabulary.txt"), encoding="utf-8") as f:
+            terms = f.read().split("\n")
+        idf = np.load(os.path.join(directory, "idf.npy"), mmap_mode="r")
+        with open(os.path.join(directory, "meta.txt")) as f:
+            meta = f.read().split("\n")
+        # Modelos guardados antes de registrar el tamaño del corpus quedan sin él
+        corpus_docs = int(meta[2]) if len(meta) > 2 and meta[2].isdigit() else None
+        return cls(terms, idf, int(meta[0]), meta[1], corpus_docs)
+
+
+def smooth_idf(doc_freq, doc_count):
+    """IDF suavizado igual al de TfidfVectorizer: ln((1 + N) / (1 + df)) + 1"""
+    return np.log((1 + doc_count) / (1 + np.asarray(doc_freq, dtype=np.float64))) + 1
+
+
+def fit_from_df_table(conn):
+    """Vocabulario e IDF desde las frecuencias de documento precalculadas por el loader"""
+    cur = conn.cursor()
+    cur.execute(f"SELECT value FROM {TABLE_NAME}_corpus_stats WHERE key = 'total_docs'")
+    row = cur.fetchone()
+    if row is None:
+        raise RuntimeError(f"{TABLE_NAME}_corpus_stats no tiene total_docs")
+    doc_count = row[0]
+
+    # Mismo criterio que el token_pattern por defecto: términos de 2 o más caracteres
+    cur.execute(f"""
+        SELECT term, doc_freq FROM {TABLE_NAME}_df
+        WHERE doc_freq >= %s AND length(term) >= 2
+        ORDER BY doc_freq DESC, term
+        LIMIT %s
+    """, (MIN_DF, MAX_FEATURES))
+    rows = cur.fetchall()
+    cur.close()
+
+    terms = [term for term, _ in rows]
+    idf = smooth_idf([doc_freq for _, doc_freq in rows], doc_count)
+    return CorpusTfidf(terms, idf, doc_count, f"{TABLE_NAME}_df")
+
+
+def fit_from_corpus(conn, preprocess):
+    """Cuenta frecuencias de documento sobre una muestra de best_answer normalizados"""
+    cur = conn.cursor(name="tfidf_fit")
+    cur.itersize = 10000
+    cur.execute(f"SELECT best_answer FROM {TABLE_NAME} WHERE best_answer <> '' LIMIT %s", (FIT_SAMPLE,))
+    texts = [preprocess(best_answer) for (best_answer,) in cur]
+    cur.close()
+
+    counter = CountVectorizer(binary=True, min_df=MIN_DF, max_features=MAX_FEATURES)
+    presence = counter.fit_transform(texts)
+    doc_freq = np.asarray(presence.sum(axis=0)).ravel()
+    terms = [None] * len(counter.vocabulary_)
+    for term, column in counter.vocabulary_.items():
+        terms[column] = term
+    return CorpusTfidf(terms, smooth_idf(doc_freq, len(texts)), len(texts), f"{TABLE_NAME} (muestra)")
+
+
+def corpus_size(conn):
+    """
+    Tamaño actual del corpus: total_docs que mantiene el loader o, si no hay
+    precálculo, la cantidad de filas de la tabla. Sirve para detectar un
+    modelo ajustado sobre un corpus distinto (por ejemplo, a medio cargar).
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (f"{TABLE_NAME}_corpus_stats",))
+    if cur.fetchone()[0]:
+        cur.execute(f"SELECT value FROM {TABLE_NAME}_corpus_stats WHERE key = 'total_docs'")
+        row = cur.fetchone()
+        if row is not None:
+            cur.close()
+            return row[0]
+    cur.execute(f"SELECT COUNT(*) FROM {TABLE_NAME}")
+    count = cur.fetchone()[0]
+    cur.close()
+    return count
+
+
+def fit_model(conn, preprocess):
+    """Ajusta el modelo con la mejor fuente disponible"""
+    corpus_docs = corpus_size(conn)
+    try:
+        model = fit_from_df_table(conn)
+    except Exception as e:
+        conn.rollback()
+        print(f"Frecuencias precalculadas no disponibles ({e}), se cuentan sobre una muestra del corpus")
+        model = fit_from_corpus(conn, preprocess)
+    model.corpus_docs = corpus_docs
+    return model
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "fit":
+        print(__doc__)
+        sys.exit(1)
+
+    from score_service import DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME, preprocess_text
+
+    directory = sys.argv[2] if len(sys.argv) > 2 else MODEL_DIR
+    start = time.time()
+    conn = psycopg2.connect(host=DB_HOST, port=DB_PORT, user=DB_USER, password=DB_PASSWORD, dbname=DB_NAME)
+    model = fit_model(conn, preprocess_text)
+    conn.close()
+    model.save(directory)
+    print(f"Modelo TF-IDF ({len(model.terms)} términos, {model.doc_count} documentos, "
+          f"fuente {model.source}) guardado en {directory} en {time.time() - start:.2f}s")
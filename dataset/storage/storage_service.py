@@ -1,5 +1,6 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
+from typing import Optional
 import psycopg2
 from psycopg2.extras import RealDictCursor
 import os
@@ -22,6 +23,7 @@ class QueryResult(BaseModel):
     best_answer: str
     llm_answer: str
     quality_score: float
+    query_hash: Optional[str] = None  # hash de la consulta normalizada (caché del generador)
 
 
 def get_db_connection():
@@ -61,6 +63,15 @@ def init_database():
         ON query_results(question_id)
     """)
     
+    # Columna e índice para buscar por hash de la consulta (tablas creadas antes no la tienen)
+    cur.execute("""
+        ALTER TABLE query_results ADD COLUMN IF NOT EXISTS query_hash TEXT
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_query_hash 
+        ON query_results(query_hash)
+    """)
+    
     conn.commit()
     cur.close()
     conn.close()
@@ -124,8 +135,8 @@ def store_result(result: QueryResult):
             cur.execute("""
                 INSERT INTO query_results 
                 (question_id, question_title, question_content, best_answer, 
-                 llm_answer, quality_score, access_count)
-                VALUES (%s, %s, %s, %s, %s, %s, 1)
+                 llm_answer, quality_score, access_count, query_hash)
+                VALUES (%s, %s, %s, %s, %s, %s, 1, %s)
                 RETURNING id
             """, (
                 result.question_id,
@@ -133,7 +144,8 @@ def store_result(result: QueryResult):
                 result.question_content,
                 result.best_answer,
                 result.llm_answer,
-                result.quality_score
+                result.quality_score,
+                result.query_hash
             ))
             
             result_id = cur.fetchone()[0]
@@ -244,6 +256,50 @@ def get_results(limit: int = 100, offset: int = 0):
         raise HTTPException(status_code=500, detail=f"Error al obtener resultados: {str(e)}")
 
 
+@app.get("/lookup")
+def lookup_answer(question_id: Optional[int] = None, query_hash: Optional[str] = None):
+    """
+    Busca una respuesta ya almacenada por question_id o por hash de la consulta.
+    Es el nivel persistente del caché de respuestas del generador de tráfico.
+    """
+    if question_id is None and query_hash is None:
+        raise HTTPException(status_code=400, detail="Indique question_id o query_hash")
+    
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        
+        if question_id is not None:
+            cur.execute("""
+                SELECT question_id, llm_answer, quality_score, access_count 
+                FROM query_results 
+                WHERE question_id = %s 
+                LIMIT 1
+            """, (question_id,))
+        else:
+            cur.execute("""
+                SELECT question_id, llm_answer, quality_score, access_count 
+                FROM query_results 
+                WHERE query_hash = %s 
+                LIMIT 1
+            """, (query_hash,))
+        
+        result = cur.fetchone()
+        
+        cur.close()
+        conn.close()
+        
+        if result:
+            return dict(result)
+        else:
+            raise HTTPException(status_code=404, detail="Respuesta no encontrada")
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al buscar respuesta: {str(e)}")
+
+
 @app.get("/result/{question_id}")
 def get_result_by_question(question_id: int):
     """Obtiene un resultado específico por question_id"""
@@ -0,0 +1,74 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+
+def normalize_query(query):
+    """Normaliza una consulta para que variantes triviales compartan clave"""
+    return re.sub(r'\s+', ' ', query.lower()).strip()
+
+
+def query_hash(query):
+    """Hash estable de la consulta normalizada (clave del caché en modo "query")"""
+    return hashlib.sha1(normalize_query(query).encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """
+    Caché cache-aside de respuestas del LLM con dos niveles:
+    - memoria: LRU acotado a max_entries, compartido por todos los hilos
+    - persistente: función persistent_lookup(question_id, query_hash) que
+      consulta query_results (vía el servicio de almacenamiento)
+    Las claves son el id de la pregunta (key_mode="id") o el hash de la
+    consulta normalizada (key_mode="query").
+    """
+
+    def __init__(self, max_entries=10000, key_mode="id", persistent_lookup=None):
+        if key_mode not in ("id", "query"):
+            raise ValueError("key_mode debe ser 'id' o 'query'")
+        self.max_entries = max_entries
+        self.key_mode = key_mode
+        self.persistent_lookup = persistent_lookup
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def key(self, question_id, hashed_query):
+        return question_id if self.key_mode == "id" else hashed_query
+
+    def get(self, question_id, hashed_query):
+        """Retorna (respuesta, score, nivel) o None si no está en ningún nivel"""
+        key = self.key(question_id, hashed_query)
+        with self.lock:
+            if key in self.entries:
+                answer, score = self.entries[key]
+                if answer:
+                    self.entries.move_to_end(key)
+                    return answer, score, "memory"
+                # Una respuesta vacía no es válida: se descarta y cuenta como fallo
+                del self.entries[key]
+
+        if self.persistent_lookup is None:
+            return None
+
+        stored = self.persistent_lookup(question_id, hashed_query)
+        if not stored or not stored.get("llm_answer"):
+            return None
+
+        answer, score = stored["llm_answer"], stored.get("quality_score") or 0.0
+        self.put(question_id, hashed_query, answer, score)
+        return answer, score, "storage"
+
+    def put(self, question_id, hashed_query, answer, score):
+        """
+        Guarda una respuesta en memoria, expulsando la menos usada si se excede el límite.
+        Las respuestas vacías (consultas fallidas) no se guardan, igual que en el nivel persistente.
+        """
+        if not answer:
+            return
+        key = self.key(question_id, hashed_query)
+        with self.lock:
+            self.entries[key] = (answer, score)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
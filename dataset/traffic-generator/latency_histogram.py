@@ -0,0 +1,166 @@
+import math
+
+
+class LatencyHistogram:
+    """
+    Histograma de latencias de memoria fija (estilo HDR).
+    Usa buckets logarítmicos con precisión relativa constante entre 1µs y
+    max_seconds, así la memoria no crece con la cantidad de consultas.
+    Los valores se registran en segundos.
+    """
+
+    PERCENTILES = (50, 90, 99, 99.9)
+
+    def __init__(self, precision=0.01, max_seconds=3600.0):
+        self.precision = precision
+        self.max_seconds = max_seconds
+        self._log_base = math.log1p(precision)
+        self.counts = [0] * (self._index(max_seconds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.min = None
+        self.max = None
+
+    def _index(self, seconds):
+        """Bucket 0 = [0, 1µs); bucket k = [(1+p)^(k-1), (1+p)^k) µs"""
+        micros = seconds * 1e6
+        if micros < 1:
+            return 0
+        return int(math.log(micros) / self._log_base) + 1
+
+    def _bucket_value(self, index):
+        """Valor representativo (medio geométrico) de un bucket, en segundos"""
+        if index == 0:
+            return 0.0
+        return math.exp((index - 0.5) * self._log_base) / 1e6
+
+    def record(self, seconds):
+        """Registra una latencia (en segundos)"""
+        seconds = max(0.0, seconds)
+        index = min(self._index(seconds), len(self.counts) - 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.total_sq += seconds * seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def std(self):
+        if not self.count:
+            return 0.0
+        variance = self.total_sq / self.count - self.mean() ** 2
+        return math.sqrt(max(0.0, variance))
+
+    def percentile(self, p):
+        """Percentil p (0-100) con error relativo acotado por la precisión"""
+        if not self.count:
+            return 0.0
+        target = max(1, math.ceil(p / 100 * self.count))
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return min(max(self._bucket_value(index), self.min), self.max)
+        return self.max
+
+    def merge(self, other):
+        """Suma otro histograma con la misma configuración (p. ej. de otro worker)"""
+        if other.precision != self.precision or len(other.counts) != len(self.counts):
+            raise ValueError("Solo se pueden combinar histogramas con la misma configuración")
+        for index, bucket_count in enumerate(other.counts):
+            self.counts[index] += bucket_count
+        self.count += other.count
+        self.total += other.total
+        self.total_sq += other.total_sq
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def summary(self):
+        """Resumen en milisegundos: conteo, media, desviación, mínimo, percentiles y máximo"""
+        result = {
+            "count": self.count,
+            "mean_ms": round(self.mean() * 1000, 3),
+            "std_ms": round(self.std() * 1000, 3),
+            "min_ms": round((self.min or 0.0) * 1000, 3),
+        }
+        for p in self.PERCENTILES:
+            result[f"p{p:g}_ms".replace(".", "_")] = round(self.percentile(p) * 1000, 3)
+        result["max_ms"] = round((self.max or 0.0) * 1000, 3)
+        return result
+
+    def to_dict(self):
+        """Serializa el histograma (buckets dispersos) para exportar o combinar"""
+        return {
+            "precision": self.precision,
+            "max_seconds": self.max_seconds,
+            "count": self.count,
+            "sum": self.total,
+            "sum_sq": self.total_sq,
+            "min": self.min,
+            "max": self.max,
+            "buckets": {str(index): c for index, c in enumerate(self.counts) if c}
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(precision=data["precision"], max_seconds=data["max_seconds"])
+        for index, bucket_count in data["buckets"].items():
+            histogram.counts[int(index)] = bucket_count
+        histogram.count = data["count"]
+        histogram.total = data["sum"]
+        histogram.total_sq = data["sum_sq"]
+        histogram.min = data["min"]
+        histogram.max = data["max"]
+        return histogram
+
+
+class ThroughputWindows:
+    """
+    Cuenta consultas completadas y fallidas por ventana de tiempo fija.
+    La memoria crece con la duración de la corrida, no con las consultas.
+    """
+
+    def __init__(self, window_seconds=10.0):
+        self.window_seconds = window_seconds
+        self.windows = {}
+
+    def record(self, offset_seconds, ok=True):
+        """Registra una consulta terminada offset_seconds después del inicio"""
+        window = int(offset_seconds // self.window_seconds)
+        counts = self.windows.setdefault(window, [0, 0])
+        counts[0 if ok else 1] += 1
+
+    def merge(self, other):
+        for window, (ok, failed) in other.windows.items():
+            counts = self.windows.setdefault(window, [0, 0])
+            counts[0] += ok
+            counts[1] += failed
+
+    def rows(self):
+        """Filas ordenadas por ventana con la tasa de consultas/s de cada una"""
+        return [
+            {
+                "window_start_s": window * self.window_seconds,
+                "completed": ok,
+                "failed": failed,
+                "throughput_per_s": round(ok / self.window_seconds, 3)
+            }
+            for window, (ok, failed) in sorted(self.windows.items())
+        ]
+
+    def to_dict(self):
+        return {
+            "window_seconds": self.window_seconds,
+            "windows": {str(window): counts for window, counts in self.windows.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        throughput = cls(window_seconds=data["window_seconds"])
+        throughput.windows = {int(window): list(counts) for window, counts in data["windows"].items()}
+        return throughput
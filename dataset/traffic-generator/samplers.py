@@ -0,0 +1,129 @@
+import numpy as np
+
+
+class QuestionSampler:
+    """
+    Estrategia base de selección de preguntas.
+    Recibe el arreglo de IDs precargado y elige IDs en memoria, sin
+    aleatoriedad del lado de SQL.
+
+    seed controla los sorteos; layout_seed controla qué preguntas son
+    populares (permutaciones), para que varios workers con semillas
+    distintas compartan el mismo ranking de popularidad.
+    """
+
+    def __init__(self, ids, seed=None, layout_seed=None):
+        if len(ids) == 0:
+            raise ValueError("No hay preguntas en la base de datos")
+        self.ids = ids
+        self.rng = np.random.default_rng(seed)
+        self.layout_rng = np.random.default_rng(seed if layout_seed is None else layout_seed)
+
+    def sample_indices(self, n):
+        """Retorna n posiciones dentro de self.ids"""
+        raise NotImplementedError
+
+    def sample(self, n):
+        """Retorna n IDs de pregunta (pueden repetirse)"""
+        return self.ids[self.sample_indices(n)]
+
+
+class UniformSampler(QuestionSampler):
+    """Selección uniforme: todas las preguntas tienen la misma probabilidad"""
+
+    def sample_indices(self, n):
+        return self.rng.integers(0, len(self.ids), size=n)
+
+
+class ZipfSampler(QuestionSampler):
+    """
+    Popularidad Zipf: la pregunta de rango k se elige con probabilidad
+    proporcional a 1/k^s. El rango de cada pregunta se asigna con una
+    permutación aleatoria (semilla), para no correlacionar popularidad con ID.
+    """
+
+    def __init__(self, ids, seed=None, layout_seed=None, s=1.0):
+        super().__init__(ids, seed=seed, layout_seed=layout_seed)
+        if s < 0:
+            raise ValueError("El exponente de Zipf debe ser >= 0")
+        self.s = s
+        weights = 1.0 / np.power(np.arange(1, len(ids) + 1, dtype=np.float64), s)
+        self.cdf = np.cumsum(weights)
+        self.cdf /= self.cdf[-1]
+        self.rank_to_index = self.layout_rng.permutation(len(ids))
+
+    def sample_indices(self, n):
+        ranks = np.searchsorted(self.cdf, self.rng.random(n), side="right")
+        ranks = np.minimum(ranks, len(self.ids) - 1)
+        return self.rank_to_index[ranks]
+
+
+class HotSetSampler(QuestionSampler):
+    """
+    Conjunto caliente: una fracción hot_fraction de las preguntas recibe
+    hit_fraction de las consultas; el resto se reparte uniforme entre las demás.
+    """
+
+    def __init__(self, ids, seed=None, layout_seed=None, hot_fraction=0.01, hit_fraction=0.9):
+        super().__init__(ids, seed=seed, layout_seed=layout_seed)
+        if not 0 < hot_fraction <= 1 or not 0 <= hit_fraction <= 1:
+            raise ValueError("hot_fraction debe estar en (0, 1] y hit_fraction en [0, 1]")
+        self.hit_fraction = hit_fraction
+        hot_size = max(1, int(len(ids) * hot_fraction))
+        order = self.layout_rng.permutation(len(ids))
+        self.hot = order[:hot_size]
+        self.cold = order[hot_size:]
+
+    def sample_indices(self, n):
+        is_hot = self.rng.random(n) < self.hit_fraction
+        if len(self.cold) == 0:
+            is_hot[:] = True
+        indices = np.empty(n, dtype=np.int64)
+        n_hot = int(is_hot.sum())
+        indices[is_hot] = self.hot[self.rng.integers(0, len(self.hot), size=n_hot)]
+        if n_hot < n:
+            indices[~is_hot] = self.cold[self.rng.integers(0, len(self.cold), size=n - n_hot)]
+        return indices
+
+
+class WorkingSetSampler(QuestionSampler):
+    """
+    Conjunto de trabajo que se desplaza: se elige uniforme dentro de una
+    ventana de size preguntas, que avanza step posiciones cada shift_every
+    consultas (sobre una permutación con semilla, con vuelta al inicio).
+    """
+
+    def __init__(self, ids, seed=None, layout_seed=None, size=1000, shift_every=1000, step=100):
+        super().__init__(ids, seed=seed, layout_seed=layout_seed)
+        if size <= 0 or shift_every <= 0 or step < 0:
+            raise ValueError("size y shift_every deben ser > 0 y step >= 0")
+        self.size = min(size, len(ids))
+        self.shift_every = shift_every
+        self.step = step
+        self.order = self.layout_rng.permutation(len(ids))
+        self.served = 0
+
+    def sample_indices(self, n):
+        counts = self.served + np.arange(n)
+        self.served += n
+        offsets = (counts // self.shift_every) * self.step
+        positions = (offsets + self.rng.integers(0, self.size, size=n)) % len(self.ids)
+        return self.order[positions]
+
+
+# Registro de estrategias disponibles (SAMPLER=<nombre>)
+SAMPLERS = {
+    "uniform": UniformSampler,
+    "zipf": ZipfSampler,
+    "hotset": HotSetSampler,
+    "workingset": WorkingSetSampler,
+}
+
+
+def build_sampler(name, ids, seed=None, layout_seed=None, **kwargs):
+    """Construye la estrategia de selección indicada por nombre"""
+    try:
+        sampler_class = SAMPLERS[name]
+    except KeyError:
+        raise ValueError(f"Estrategia de selección desconocida: {name}. Use: {', '.join(SAMPLERS)}")
+    return sampler_class(ids, seed=seed, layout_seed=layout_seed, **kwargs)
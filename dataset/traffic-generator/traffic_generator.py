@@ -1,11 +1,26 @@
 import os
+import sys
 import time
 import random
+import asyncio
+import csv
+import glob
+import json
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import psycopg2
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime
 import numpy as np
 
+from samplers import build_sampler
+from latency_histogram import LatencyHistogram, ThroughputWindows
+from workload_trace import TraceWriter, load_trace
+from answer_cache import AnswerCache, query_hash
+
 # Configuración desde variables de entorno
 DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_PORT = os.getenv("DB_PORT", "5432")
@@ -14,8 +29,12 @@ DB_PASSWORD = os.getenv("DB_PASSWORD", "postgres")
 DB_NAME = os.getenv("DB_NAME", "yahoo_dataset")
 
 LLM_SERVICE_URL = os.getenv("LLM_SERVICE_URL", "http://llm:5000/ask")
+LLM_BATCH_URL = os.getenv("LLM_BATCH_URL", LLM_SERVICE_URL.rstrip("/") + "/batch")
+LLM_STREAM_URL = os.getenv("LLM_STREAM_URL", LLM_SERVICE_URL.rstrip("/") + "/stream")
+LLM_STREAM = os.getenv("LLM_STREAM", "0") == "1"  # 1 = /ask/stream, midiendo el tiempo al primer fragmento
 SCORE_SERVICE_URL = os.getenv("SCORE_SERVICE_URL", "http://score:6000/score")
 STORAGE_SERVICE_URL = os.getenv("STORAGE_SERVICE_URL", "http://storage:7000/store")  # VARIABLE DE ENTORNO NUEVA STORAGE
+STORAGE_LOOKUP_URL = os.getenv("STORAGE_LOOKUP_URL", "http://storage:7000/lookup")
 SCORE_METHOD = os.getenv("SCORE_METHOD", "combined")
 
 # Parámetros de distribución
@@ -25,16 +44,124 @@ MIN_INTERVAL = int(os.getenv("MIN_INTERVAL", "100"))
 MAX_INTERVAL = int(os.getenv("MAX_INTERVAL", "2000"))
 TOTAL_QUERIES = int(os.getenv("TOTAL_QUERIES", "100"))
 
+# Modo de lazo: "closed" (una consulta tras otra), "open" (llegadas según la distribución,
+# despachadas como tareas concurrentes) o "pipeline" (llegadas de lazo abierto que pasan
+# por etapas LLM -> score -> store con colas acotadas entre ellas)
+LOOP_MODE = os.getenv("LOOP_MODE", "closed")
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", "100"))  # tope de consultas simultáneas en modo open
+OVERLOAD_POLICY = os.getenv("OVERLOAD_POLICY", "queue")  # "queue" (esperan turno) o "drop" (se descartan)
+
+# Modo pipeline: concurrencia de cada etapa y tamaño de las colas entre etapas
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "50"))
+SCORE_CONCURRENCY = int(os.getenv("SCORE_CONCURRENCY", "10"))
+STORE_CONCURRENCY = int(os.getenv("STORE_CONCURRENCY", "10"))
+STAGE_QUEUE_SIZE = int(os.getenv("STAGE_QUEUE_SIZE", "1000"))
+QUEUE_SAMPLE_INTERVAL = float(os.getenv("QUEUE_SAMPLE_INTERVAL", "0.5"))  # segundos entre muestras de profundidad
+LLM_BATCH_SIZE = int(os.getenv("LLM_BATCH_SIZE", "1"))  # > 1: la etapa LLM agrupa consultas en /ask/batch
+PIPELINE_STAGES = ("llm", "score", "store")
+VERBOSE = os.getenv("VERBOSE", "1") == "1"
+
+# Selección de preguntas: estrategia en memoria sobre el índice de IDs precargado
+SAMPLER = os.getenv("SAMPLER", "uniform")  # "uniform", "zipf", "hotset" o "workingset"
+FETCH_BATCH_SIZE = int(os.getenv("FETCH_BATCH_SIZE", "100"))  # filas traídas por consulta a la BD
+SEED = int(os.getenv("SEED")) if os.getenv("SEED") else None  # semilla para reproducibilidad
+POPULARITY_SEED = SEED  # semilla del ranking de popularidad, común a todos los workers
+
+# Parámetros de los modelos de popularidad
+SAMPLER_OPTIONS = {
+    "zipf": {
+        "s": float(os.getenv("ZIPF_S", "1.0"))
+    },
+    "hotset": {
+        "hot_fraction": float(os.getenv("HOT_SET_FRACTION", "0.01")),  # fracción de preguntas calientes
+        "hit_fraction": float(os.getenv("HOT_HIT_FRACTION", "0.9"))  # fracción de consultas que van al conjunto caliente
+    },
+    "workingset": {
+        "size": int(os.getenv("WORKING_SET_SIZE", "1000")),
+        "shift_every": int(os.getenv("WORKING_SET_SHIFT_EVERY", "1000")),  # consultas entre desplazamientos
+        "step": int(os.getenv("WORKING_SET_SHIFT_STEP", "100"))  # preguntas que avanza la ventana
+    }
+}
+
+# Caché cache-aside antes del LLM: en un acierto se omiten el LLM y el score
+ANSWER_CACHE = os.getenv("ANSWER_CACHE", "0") == "1"
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))  # nivel en memoria
+CACHE_KEY = os.getenv("CACHE_KEY", "id")  # "id" (question_id) o "query" (hash de la consulta normalizada)
+CACHE_PERSISTENT = os.getenv("CACHE_PERSISTENT", "1") == "1"  # nivel persistente: query_results
+
+# Trazas de carga: "record" graba (offset, question_id) de cada llegada y "replay"
+# reproduce una traza grabada, con el ritmo original dividido por REPLAY_SPEED
+TRACE_MODE = os.getenv("TRACE_MODE", "off")  # "off", "record" o "replay"
+TRACE_PATH = os.getenv("TRACE_PATH", "trace.ndjson")
+REPLAY_SPEED = float(os.getenv("REPLAY_SPEED", "1.0"))
+
+# Precalentamiento del caché del servicio LLM (subcomando "warmup")
+WARMUP_QUESTIONS = int(os.getenv("WARMUP_QUESTIONS", "1000"))  # preguntas muestreadas con el mismo SAMPLER
+WARMUP_BATCH_SIZE = int(os.getenv("WARMUP_BATCH_SIZE", "50"))
+
+# Generación distribuida: WORKERS procesos en este contenedor y REPLICAS contenedores
+# (uno por REPLICA_INDEX, ver README). Cada worker recibe su parte de la tasa y su propia semilla.
+WORKERS = int(os.getenv("WORKERS", "1"))
+REPLICAS = int(os.getenv("REPLICAS", "1"))
+
+# Reporte de latencias
+REPORT_PATH = os.getenv("REPORT_PATH", "traffic_report.json")  # .json o .csv
+THROUGHPUT_WINDOW = float(os.getenv("THROUGHPUT_WINDOW", "10"))  # segundos por ventana de throughput
+# Mínimo de segundos entre impresiones de estadísticas parciales (se imprimen desde el event loop)
+STATS_PRINT_INTERVAL = float(os.getenv("STATS_PRINT_INTERVAL", "1"))
+
+# Etapas con histograma de latencia propio (db_fetch se mide por lote de preguntas;
+# wait_* es el tiempo en la cola de cada etapa en modo pipeline; llm_ttft es el
+# tiempo al primer fragmento con LLM_STREAM=1)
+LATENCY_STAGES = ("db_fetch", "llm", "llm_ttft", "score", "store", "end_to_end",
+                  "wait_llm", "wait_score", "wait_store",
+                  "cache_lookup", "end_to_end_cache_hit", "end_to_end_cache_miss")
+
 # Estadísticas
 stats = {
     "total_sent": 0,
     "successful": 0,
     "failed": 0,
     "start_time": None,
-    "intervals": [],
+    "intervals": LatencyHistogram(),  # intervalos entre llegadas, memoria fija
     "total_score": 0.0,
     "score_count": 0,
-    "stored_count": 0  # AÑADIDO LA CANTIDAD DE STORED COUNT
+    "stored_count": 0,  # AÑADIDO LA CANTIDAD DE STORED COUNT
+    "cache_hits_memory": 0,
+    "cache_hits_storage": 0,
+    "cache_misses": 0,
+    # Calidad de respuestas que el LLM reutilizó de una pregunta parecida vs. generadas
+    "llm_reused": 0,
+    "score_sum_reused": 0.0,
+    "score_count_reused": 0,
+    "score_sum_fresh": 0.0,
+    "score_count_fresh": 0,
+    "dropped": 0,  # llegadas descartadas por superar MAX_IN_FLIGHT (modo open)
+    "in_flight": 0,
+    "max_in_flight": 0,
+    "max_schedule_lag": 0.0,  # máximo retraso del despachador respecto al calendario (modo open)
+    "last_stats_print": 0.0,
+    "latency": {stage: LatencyHistogram() for stage in LATENCY_STAGES},
+    "throughput": ThroughputWindows(THROUGHPUT_WINDOW),
+    # Profundidad de las colas del pipeline, muestreada cada QUEUE_SAMPLE_INTERVAL
+    "queue_depth": {stage: {"current": 0, "max": 0, "sum": 0, "samples": 0} for stage in PIPELINE_STAGES}
+}
+
+
+def build_http_session(pool_size):
+    """Sesión HTTP con conexiones keep-alive reutilizables (hasta pool_size simultáneas)"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Una sesión por servicio, en vez de abrir una conexión nueva en cada consulta
+http_sessions = {
+    "llm": build_http_session(max(MAX_IN_FLIGHT, LLM_CONCURRENCY)),
+    "score": build_http_session(max(MAX_IN_FLIGHT, SCORE_CONCURRENCY)),
+    "store": build_http_session(max(MAX_IN_FLIGHT, STORE_CONCURRENCY))
 }
 
 
@@ -54,63 +181,269 @@ def connect_db():
         raise
 
 
-def get_random_question(conn):
-    """Obtiene una pregunta aleatoria del dataset"""
+def load_question_ids(conn):
+    """
+    Carga una sola vez el espacio de IDs de yahoo_answers como arreglo compacto.
+    Usa un cursor del lado del servidor para no materializar todas las tuplas.
+    """
+    cur = conn.cursor(name="question_ids")
+    cur.itersize = 50000
+    cur.execute("SELECT id FROM yahoo_answers ORDER BY id")
+    ids = np.fromiter((row[0] for row in cur), dtype=np.int64)
+    cur.close()
+    conn.commit()
+
+    if len(ids) == 0:
+        raise Exception("No hay preguntas en la base de datos")
+
+    return ids
+
+
+def fetch_questions_by_ids(conn, ids):
+    """
+    Obtiene en una sola consulta las filas de los IDs indicados (por clave primaria).
+    Retorna las preguntas en el mismo orden de ids, incluyendo repeticiones.
+    """
+    ids = [int(question_id) for question_id in ids]
     try:
         cur = conn.cursor()
         cur.execute("""
             SELECT id, class, question_title, question_content, best_answer
             FROM yahoo_answers
-            ORDER BY RANDOM()
-            LIMIT 1
-        """)
-        row = cur.fetchone()
+            WHERE id = ANY(%s)
+        """, (list(set(ids)),))
+        rows = cur.fetchall()
         cur.close()
-        
-        if not row:
-            raise Exception("No hay preguntas en la base de datos")
-        
-        return {
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error al obtener preguntas: {e}")
+        raise
+
+    by_id = {
+        row[0]: {
             "id": row[0],
             "class": row[1],
             "question_title": row[2],
             "question_content": row[3],
             "best_answer": row[4]
         }
-    except Exception as e:
-        print(f"❌ Error al obtener pregunta: {e}")
-        raise
+        for row in rows
+    }
+    return [by_id[question_id] for question_id in ids if question_id in by_id]
+
+
+class QuestionSource:
+    """
+    Entrega preguntas elegidas por una estrategia de selección (ver samplers.py).
+    Los IDs se muestrean en memoria y las filas se traen por lotes de
+    FETCH_BATCH_SIZE por clave primaria.
+    """
+
+    def __init__(self, conn, sampler, batch_size):
+        self.conn = conn
+        self.sampler = sampler
+        self.batch_size = batch_size
+        self.buffer = deque()
+        self.lock = threading.Lock()
 
+    def __len__(self):
+        return len(self.buffer)
 
-def query_llm(question):
-    """Consulta al LLM con una pregunta"""
+    def refill(self):
+        """Muestrea un lote de IDs y trae sus filas a la cola interna"""
+        start = time.perf_counter()
+        questions = fetch_questions_by_ids(self.conn, self.sampler.sample(self.batch_size))
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.buffer.extend(questions)
+            stats["latency"]["db_fetch"].record(elapsed)
+
+    def next_question(self):
+        """Retorna la siguiente pregunta, recargando el lote si se agotó"""
+        while True:
+            with self.lock:
+                if self.buffer:
+                    return self.buffer.popleft()
+            self.refill()
+
+    def next_interval(self):
+        return next_interval()
+
+
+class ReplaySource:
+    """
+    Fuente de preguntas que reproduce una traza grabada. Todas las preguntas
+    necesarias se traen en bloque desde yahoo_answers antes de empezar, así la
+    base de datos no interviene durante la corrida.
+    """
+
+    def __init__(self, conn, path, speed=1.0, chunk_size=10000):
+        entries = load_trace(path)
+        unique_ids = list({question_id for _, question_id in entries})
+
+        start = time.time()
+        questions = {}
+        for offset in range(0, len(unique_ids), chunk_size):
+            for question in fetch_questions_by_ids(conn, unique_ids[offset:offset + chunk_size]):
+                questions[question["id"]] = question
+
+        missing = len(unique_ids) - len(questions)
+        if missing:
+            print(f"⚠️  {missing} preguntas de la traza no existen en la base de datos, se omiten")
+
+        entries = [(t, question_id) for t, question_id in entries if question_id in questions]
+        self.questions = [questions[question_id] for _, question_id in entries]
+        # Intervalo tras cada llegada = distancia a la siguiente, escalada por la velocidad
+        self.intervals = [
+            (entries[k + 1][0] - entries[k][0]) / speed for k in range(len(entries) - 1)
+        ] + [0.0]
+        # Instante de cada llegada respecto de la primera (lo usa el modo closed)
+        self.offsets = [(t - entries[0][0]) / speed for t, _ in entries]
+        self.position = 0
+        self.interval_position = 0
+        print(f"✅ Traza {path}: {len(entries)} llegadas, {len(questions)} preguntas "
+              f"precargadas en {time.time() - start:.2f}s (velocidad x{speed})")
+
+    def __len__(self):
+        return len(self.questions) - self.position
+
+    def refill(self):
+        """Nada que recargar: la traza completa se precargó al inicio"""
+
+    def next_question(self):
+        question = self.questions[self.position]
+        self.position += 1
+        return question
+
+    def next_interval(self):
+        interval = self.intervals[self.interval_position]
+        self.interval_position += 1
+        return interval
+
+    def offset(self, i):
+        """Instante de la llegada i (segundos desde el inicio de la reproducción)"""
+        return self.offsets[i]
+
+
+def build_question_source(conn):
+    """Precarga el índice de IDs (o la traza a reproducir) y arma la fuente de preguntas"""
+    global TOTAL_QUERIES
+
+    if TRACE_MODE == "replay":
+        source = ReplaySource(conn, TRACE_PATH, speed=REPLAY_SPEED)
+        TOTAL_QUERIES = len(source)
+        return source
+
+    start = time.time()
+    ids = load_question_ids(conn)
+    print(f"✅ Índice de {len(ids)} preguntas cargado en {time.time() - start:.2f}s")
+    options = SAMPLER_OPTIONS.get(SAMPLER, {})
+    sampler = build_sampler(SAMPLER, ids, seed=SEED, layout_seed=POPULARITY_SEED, **options)
+    print(f"📊 Selección de preguntas: {SAMPLER} {options} (lotes de {FETCH_BATCH_SIZE}, semilla: {SEED})\n")
+    return QuestionSource(conn, sampler, FETCH_BATCH_SIZE)
+
+
+def build_query(question):
+    """Texto de la consulta que se envía al LLM"""
+    return f"{question['question_title']} {question['question_content']}"
+
+
+def query_llm_stream(question, timings):
+    """
+    Consulta /ask/stream y arma la respuesta con los fragmentos NDJSON.
+    Deja en timings["llm_ttft"] el tiempo hasta el primer fragmento.
+    Retorna (respuesta, reutilizada de una pregunta parecida).
+    """
+    start = time.perf_counter()
+    parts = []
+    reused = False
+    with http_sessions["llm"].get(
+        LLM_STREAM_URL,
+        params={"query": build_query(question), "question_id": question["id"]},
+        timeout=30,
+        stream=True
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            event = json.loads(line)
+            if "error" in event:
+                raise RuntimeError(f"LLM: {event['error']}")
+            if "token" in event:
+                if not parts:
+                    timings["llm_ttft"] = time.perf_counter() - start
+                parts.append(event["token"])
+            if event.get("reused"):
+                reused = True
+    return "".join(parts), reused
+
+
+def query_llm(question, timings=None):
+    """
+    Consulta al LLM con una pregunta (en streaming si LLM_STREAM=1 y se pasan timings).
+    Retorna (respuesta, reutilizada de una pregunta parecida por el servicio LLM).
+    """
     try:
-        query = f"{question['question_title']} {question['question_content']}"
+        if LLM_STREAM and timings is not None:
+            return query_llm_stream(question, timings)
+
+        query = build_query(question)
         
-        response = requests.get(
+        response = http_sessions["llm"].get(
             LLM_SERVICE_URL,
-            params={"query": query},
+            # question_id le permite al backend mock derivar la respuesta del best_answer
+            params={"query": query, "question_id": question["id"]},
             timeout=30
         )
         response.raise_for_status()
         
         data = response.json()
-        return data.get("answer", "")
+        # El servicio LLM informa sus errores con status 200 y {"error": ...}
+        if "error" in data:
+            raise RuntimeError(f"LLM: {data['error']}")
+        return data.get("answer", ""), bool(data.get("reused"))
     
     except Exception as e:
         print(f"❌ Error al consultar LLM: {e}")
         raise
 
 
-def calculate_score(llm_answer, best_answer):
-    """Calcula el score de calidad entre la respuesta del LLM y la mejor respuesta"""
+def query_llm_batch(questions):
+    """
+    Consulta al LLM varias preguntas en una sola solicitud a /ask/batch.
+    Retorna, en el mismo orden, (respuesta, reutilizada) de cada una o la excepción de su error.
+    """
+    response = http_sessions["llm"].post(
+        LLM_BATCH_URL,
+        json={"items": [{"query": build_query(q), "question_id": q["id"]} for q in questions]},
+        timeout=60
+    )
+    response.raise_for_status()
+
+    answers = []
+    for result in response.json()["results"]:
+        if "error" in result:
+            answers.append(RuntimeError(f"LLM: {result['error']}"))
+        else:
+            answers.append((result.get("answer", ""), bool(result.get("reused"))))
+    return answers
+
+
+def calculate_score(llm_answer, best_answer, question_id=None):
+    """
+    Calcula el score de calidad entre la respuesta del LLM y la mejor respuesta.
+    Con question_id el servicio de score puede usar el best_answer precalculado.
+    """
     try:
-        response = requests.post(
+        response = http_sessions["score"].post(
             SCORE_SERVICE_URL,
             json={
                 "llm_answer": llm_answer,
                 "best_answer": best_answer,
-                "method": SCORE_METHOD
+                "method": SCORE_METHOD,
+                "question_id": question_id
             },
             timeout=10
         )
@@ -132,7 +465,7 @@ def calculate_score(llm_answer, best_answer):
 def store_result(question, llm_answer, quality_score):
     """Almacena el resultado en el servicio de almacenamiento"""
     try:
-        response = requests.post(
+        response = http_sessions["store"].post(
             STORAGE_SERVICE_URL,
             json={
                 "question_id": question['id'],
@@ -140,7 +473,8 @@ def store_result(question, llm_answer, quality_score):
                 "question_content": question['question_content'],
                 "best_answer": question['best_answer'],
                 "llm_answer": llm_answer,
-                "quality_score": quality_score
+                "quality_score": quality_score,
+                "query_hash": query_hash(build_query(question))
             },
             timeout=10
         )
@@ -154,6 +488,40 @@ def store_result(question, llm_answer, quality_score):
         return None
 
 
+def lookup_stored_answer(question_id, hashed_query):
+    """Nivel persistente del caché: busca una respuesta ya almacenada en query_results"""
+    params = {"query_hash": hashed_query} if CACHE_KEY == "query" else {"question_id": question_id}
+    try:
+        response = http_sessions["store"].get(STORAGE_LOOKUP_URL, params=params, timeout=5)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+    except Exception as e:
+        print(f"❌ Error al consultar caché persistente: {e}")
+        return None
+
+
+answer_cache = AnswerCache(
+    max_entries=CACHE_MAX_ENTRIES,
+    key_mode=CACHE_KEY,
+    persistent_lookup=lookup_stored_answer if CACHE_PERSISTENT else None
+) if ANSWER_CACHE else None
+
+
+def lookup_cached_answer(question):
+    """
+    Consulta el caché antes de llamar al LLM.
+    Retorna ((respuesta, score, nivel) o None, hash de la consulta, segundos de la búsqueda).
+    """
+    hashed_query = query_hash(build_query(question))
+    if answer_cache is None:
+        return None, hashed_query, 0.0
+    start = time.perf_counter()
+    cached = answer_cache.get(question["id"], hashed_query)
+    return cached, hashed_query, time.perf_counter() - start
+
+
 def generate_poisson_interval(lambda_rate):
     """Genera un intervalo de tiempo siguiendo una distribución de Poisson"""
     u = random.random()
@@ -166,6 +534,119 @@ def generate_uniform_interval(min_ms, max_ms):
     return random.uniform(min_ms / 1000, max_ms / 1000)
 
 
+def next_interval():
+    """Genera el siguiente intervalo entre llegadas según DISTRIBUTION_TYPE"""
+    if DISTRIBUTION_TYPE == "poisson":
+        return generate_poisson_interval(LAMBDA)
+    return generate_uniform_interval(MIN_INTERVAL, MAX_INTERVAL)
+
+
+def handle_query(question, arrival=None):
+    """
+    Ejecuta una consulta completa (LLM -> score -> almacenamiento).
+    No toca las estadísticas: retorna un dict con el resultado y la latencia
+    de cada etapa para que el llamador lo registre (así el modo open puede
+    hacerlo desde el event loop). arrival es el instante (perf_counter) de la
+    llegada programada; si se omite, end_to_end parte al iniciar la consulta.
+    """
+    if arrival is None:
+        arrival = time.perf_counter()
+    timings = {}
+
+    cached, hashed_query, lookup_time = lookup_cached_answer(question)
+    start_query = time.perf_counter()
+    llm_reused = False
+    if cached:
+        # Acierto: se omiten el LLM y el score y se usa la respuesta guardada
+        llm_answer, quality_score, cache_tier = cached
+    else:
+        cache_tier = "miss"
+        llm_answer, llm_reused = query_llm(question, timings)
+        score_start = time.perf_counter()
+        quality_score = calculate_score(llm_answer, question['best_answer'], question['id'])
+        timings["llm"] = score_start - start_query
+        timings["score"] = time.perf_counter() - score_start
+        if answer_cache is not None:
+            answer_cache.put(question["id"], hashed_query, llm_answer, quality_score)
+    store_start = time.perf_counter()
+
+    # ALMACENAR RESULTADOS
+    storage_result = store_result(question, llm_answer, quality_score)
+    end = time.perf_counter()
+    timings["store"] = end - store_start
+    timings["end_to_end"] = end - arrival
+    if answer_cache is not None:
+        timings["cache_lookup"] = lookup_time
+
+    return {
+        "question": question,
+        "llm_answer": llm_answer,
+        "query_time": store_start - start_query,
+        "quality_score": quality_score,
+        "storage_result": storage_result,
+        "cache": cache_tier,
+        "llm_reused": llm_reused,
+        "timings": timings
+    }
+
+
+def record_result(i, result):
+    """Registra en las estadísticas el resultado de una consulta exitosa"""
+    question = result["question"]
+    quality_score = result["quality_score"]
+    storage_result = result["storage_result"]
+
+    if VERBOSE:
+        print(f"📤 [{i + 1}/{TOTAL_QUERIES}] Pregunta ID: {question['id']}")
+        print(f"   Título: {question['question_title'][:60]}...")
+        source = "" if result["cache"] == "miss" else f" (caché: {result['cache']})"
+        print(f"   ✅ Respuesta obtenida en {result['query_time']:.2f}s{source}")
+        print(f"   LLM: {result['llm_answer'][:80]}...")
+        print(f"   🎯 Score de calidad: {quality_score:.4f}")
+
+    if storage_result:
+        if VERBOSE:
+            print(f"   💾 {storage_result['message']}")
+        stats["stored_count"] += 1
+
+    stats["successful"] += 1
+    stats["total_sent"] += 1
+    stats["total_score"] += quality_score
+    stats["score_count"] += 1
+    if result["cache"] == "miss":
+        kind = "reused" if result.get("llm_reused") else "fresh"
+        stats["llm_reused"] += kind == "reused"
+        stats[f"score_sum_{kind}"] += quality_score
+        stats[f"score_count_{kind}"] += 1
+
+    if answer_cache is not None:
+        if result["cache"] == "miss":
+            stats["cache_misses"] += 1
+        else:
+            stats[f"cache_hits_{result['cache']}"] += 1
+        hit_or_miss = "end_to_end_cache_miss" if result["cache"] == "miss" else "end_to_end_cache_hit"
+        result["timings"][hit_or_miss] = result["timings"]["end_to_end"]
+
+    for stage, seconds in result["timings"].items():
+        stats["latency"][stage].record(seconds)
+    stats["throughput"].record(time.time() - stats["start_time"], ok=True)
+
+    # Cada 10 resultados, pero como mucho una vez por STATS_PRINT_INTERVAL: imprimir
+    # cuesta milisegundos y en modo open retrasaría el calendario de llegadas
+    now = time.time()
+    if stats["total_sent"] % 10 == 0 and now - stats["last_stats_print"] >= STATS_PRINT_INTERVAL:
+        stats["last_stats_print"] = now
+        print_stats()
+
+
+def record_failure(i, error):
+    """Registra en las estadísticas una consulta fallida"""
+    print(f"❌ Error en iteración {i + 1}: {error}\n")
+    stats["failed"] += 1
+    stats["total_sent"] += 1
+    stats["throughput"].record(time.time() - stats["start_time"], ok=False)
+
+
 def print_stats():
     """Imprime estadísticas del generador"""
     if stats["start_time"] is None:
@@ -184,16 +665,161 @@ def print_stats():
     print(f"   Tasa promedio: {rate:.2f} consultas/s")
     print(f"   Score promedio: {avg_score:.4f}")
     
-    if stats["intervals"]:
-        avg_interval = np.mean(stats["intervals"])
-        std_interval = np.std(stats["intervals"])
+    if stats["intervals"].count:
+        avg_interval = stats["intervals"].mean()
+        std_interval = stats["intervals"].std()
         print(f"   Intervalo promedio: {avg_interval*1000:.2f}ms (±{std_interval*1000:.2f}ms)")
+
+    print("   Latencias (p50 / p90 / p99 / p99.9):")
+    for stage, histogram in stats["latency"].items():
+        if histogram.count:
+            summary = histogram.summary()
+            print(f"     {stage:<11} {summary['p50_ms']:.1f} / {summary['p90_ms']:.1f} / "
+                  f"{summary['p99_ms']:.1f} / {summary['p99_9_ms']:.1f} ms (n={summary['count']})")
+
+    if answer_cache is not None:
+        hits = stats["cache_hits_memory"] + stats["cache_hits_storage"]
+        lookups = hits + stats["cache_misses"]
+        hit_ratio = hits / lookups if lookups else 0.0
+        print(f"   Caché: {hits} aciertos (memoria {stats['cache_hits_memory']}, "
+              f"persistente {stats['cache_hits_storage']}), {stats['cache_misses']} fallos, "
+              f"tasa de acierto {hit_ratio:.2%}")
+
+    if stats["llm_reused"]:
+        # El servicio LLM reutilizó respuestas de preguntas parecidas (SIMILAR_CACHE=1)
+        reused_avg = stats["score_sum_reused"] / stats["score_count_reused"]
+        fresh_avg = stats["score_sum_fresh"] / stats["score_count_fresh"] if stats["score_count_fresh"] else 0.0
+        reuse_rate = stats["score_count_reused"] / (stats["score_count_reused"] + stats["score_count_fresh"])
+        print(f"   Reutilizadas por similitud: {stats['llm_reused']} ({reuse_rate:.2%}), "
+              f"score {reused_avg:.4f} vs {fresh_avg:.4f} de respuestas nuevas")
+
+    if LOOP_MODE in ("open", "pipeline"):
+        print(f"   En vuelo: {stats['in_flight']} (máx {stats['max_in_flight']})")
+        print(f"   Descartadas por sobrecarga: {stats['dropped']}")
+        print(f"   Retraso máximo del despachador: {stats['max_schedule_lag']*1000:.2f}ms")
+
+    if LOOP_MODE == "pipeline":
+        print("   Colas del pipeline (actual / promedio / máx):")
+        for name, depth in stats["queue_depth"].items():
+            avg_depth = depth["sum"] / depth["samples"] if depth["samples"] else 0.0
+            print(f"     {name:<6} {depth['current']} / {avg_depth:.1f} / {depth['max']}")
     
     print("=" * 30 + "\n")
 
 
-def generate_traffic():
-    """Función principal del generador de tráfico"""
+def build_report():
+    """Arma el reporte de la corrida: contadores, resumen por etapa, histogramas y throughput"""
+    elapsed = time.time() - stats["start_time"] if stats["start_time"] else 0.0
+    return {
+        "config": {
+            "distribution": DISTRIBUTION_TYPE,
+            "lambda": LAMBDA,
+            "loop_mode": LOOP_MODE,
+            "sampler": SAMPLER,
+            "seed": SEED,
+            "trace_mode": TRACE_MODE,
+            "total_queries": TOTAL_QUERIES,
+            "workers": WORKERS,
+            "replicas": REPLICAS
+        },
+        "counters": {
+            key: stats[key]
+            for key in ("total_sent", "successful", "failed", "stored_count", "dropped",
+                        "cache_hits_memory", "cache_hits_storage", "cache_misses",
+                        "llm_reused", "score_sum_reused", "score_count_reused",
+                        "score_sum_fresh", "score_count_fresh",
+                        "max_in_flight", "max_schedule_lag")
+        },
+        "elapsed_s": round(elapsed, 3),
+        "average_score": stats["total_score"] / stats["score_count"] if stats["score_count"] else 0.0,
+        "score_sum": stats["total_score"],
+        "score_count": stats["score_count"],
+        "latency_summary": {stage: histogram.summary() for stage, histogram in stats["latency"].items()},
+        "histograms": {stage: histogram.to_dict() for stage, histogram in stats["latency"].items()},
+        "intervals": stats["intervals"].to_dict(),
+        "throughput": stats["throughput"].to_dict(),
+        "queue_depth": stats["queue_depth"]
+    }
+
+
+def merge_report_into_stats(report):
+    """
+    Suma al estado global el reporte de un worker: contadores, histogramas y
+    ventanas de throughput. Los contadores max_* se combinan con el máximo.
+    """
+    for key, value in report["counters"].items():
+        if key.startswith("max_"):
+            stats[key] = max(stats[key], value)
+        else:
+            stats[key] += value
+
+    stats["total_score"] += report["score_sum"]
+    stats["score_count"] += report["score_count"]
+
+    for stage, data in report["histograms"].items():
+        stats["latency"][stage].merge(LatencyHistogram.from_dict(data))
+    stats["intervals"].merge(LatencyHistogram.from_dict(report["intervals"]))
+    stats["throughput"].merge(ThroughputWindows.from_dict(report["throughput"]))
+
+    for name, depth in report.get("queue_depth", {}).items():
+        merged = stats["queue_depth"][name]
+        merged["current"] += depth["current"]
+        merged["max"] = max(merged["max"], depth["max"])
+        merged["sum"] += depth["sum"]
+        merged["samples"] += depth["samples"]
+
+
+def export_report(path=None):
+    """Exporta el reporte a JSON o, si la ruta termina en .csv, a CSV (etapas + ventanas)"""
+    path = REPORT_PATH if path is None else path
+    if not path or stats["start_time"] is None:
+        return
+
+    report = build_report()
+    try:
+        if path.endswith(".csv"):
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                columns = list(next(iter(report["latency_summary"].values())).keys())
+                writer.writerow(["stage"] + columns)
+                for stage, summary in report["latency_summary"].items():
+                    writer.writerow([stage] + [summary[column] for column in columns])
+
+            windows_path = path[:-len(".csv")] + "_throughput.csv"
+            with open(windows_path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=["window_start_s", "completed", "failed", "throughput_per_s"])
+                writer.writeheader()
+                writer.writerows(stats["throughput"].rows())
+        else:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+
+        print(f"📝 Reporte exportado a {path}")
+    except Exception as e:
+        print(f"❌ Error al exportar reporte: {e}")
+
+
+def open_trace_writer():
+    """Abre el archivo de traza si TRACE_MODE=record"""
+    if TRACE_MODE != "record":
+        return None
+    print(f"📼 Grabando traza en {TRACE_PATH}")
+    return TraceWriter(TRACE_PATH, config={
+        "distribution": DISTRIBUTION_TYPE,
+        "lambda": LAMBDA,
+        "sampler": SAMPLER,
+        "seed": SEED
+    })
+
+
+def close_trace_writer(writer):
+    if writer is not None:
+        writer.close()
+        print(f"📼 Traza guardada: {writer.count} llegadas en {writer.path}")
+
+
+def print_header():
+    """Imprime la configuración del generador"""
     print("🚀 Iniciando generador de tráfico...")
     print(f"📊 Distribución: {DISTRIBUTION_TYPE}")
     
@@ -203,80 +829,575 @@ def generate_traffic():
     else:
         print(f"📊 Intervalo uniforme: {MIN_INTERVAL} - {MAX_INTERVAL} ms")
     
+    print(f"📊 Modo: {LOOP_MODE}")
+    if WORKERS > 1 or REPLICAS > 1:
+        print(f"📊 Parte de la carga: 1/{WORKERS * REPLICAS} (semilla: {SEED})")
+    if LOOP_MODE == "open":
+        print(f"📊 Máximo en vuelo: {MAX_IN_FLIGHT} (política: {OVERLOAD_POLICY})")
+    elif LOOP_MODE == "pipeline":
+        print(f"📊 Concurrencia LLM/score/store: {LLM_CONCURRENCY}/{SCORE_CONCURRENCY}/{STORE_CONCURRENCY} "
+              f"(colas de {STAGE_QUEUE_SIZE}, política: {OVERLOAD_POLICY})")
+        if LLM_BATCH_SIZE > 1:
+            print(f"📊 Lotes LLM de hasta {LLM_BATCH_SIZE} consultas ({LLM_BATCH_URL})")
+    if LLM_STREAM:
+        print(f"📊 LLM en streaming: {LLM_STREAM_URL}")
     print(f"📊 Total de consultas a generar: {TOTAL_QUERIES}\n")
+
+
+def generate_traffic():
+    """Función principal del generador de tráfico (lazo cerrado)"""
+    print_header()
     
     conn = connect_db()
     print("✅ Conectado a la base de datos\n")
     
-    stats["start_time"] = time.time()
+    trace_writer = open_trace_writer()
     
     try:
+        source = build_question_source(conn)
+        stats["start_time"] = time.time()
+        start = time.perf_counter()
+
         for i in range(TOTAL_QUERIES):
             try:
-                question = get_random_question(conn)
-                
-                print(f"📤 [{i + 1}/{TOTAL_QUERIES}] Pregunta ID: {question['id']}")
-                print(f"   Título: {question['question_title'][:60]}...")
-                
-                start_query = time.time()
-                llm_answer = query_llm(question)
-                query_time = time.time() - start_query
-                
-                print(f"   ✅ Respuesta obtenida en {query_time:.2f}s")
-                print(f"   LLM: {llm_answer[:80]}...")
-                
-                quality_score = calculate_score(llm_answer, question['best_answer'])
-                print(f"   🎯 Score de calidad: {quality_score:.4f}")
-                
-                # ALMACENAR RESULTADOS
-                storage_result = store_result(question, llm_answer, quality_score)
-                if storage_result:
-                    print(f"   💾 {storage_result['message']}")
-                    stats["stored_count"] += 1
-                
-                stats["successful"] += 1
-                stats["total_sent"] += 1
-                stats["total_score"] += quality_score
-                stats["score_count"] += 1
+                question = source.next_question()
+                if trace_writer:
+                    trace_writer.write(time.perf_counter() - start, question["id"])
+                result = handle_query(question)
+                record_result(i, result)
+            except Exception as e:
+                record_failure(i, e)
                 
-                if (i + 1) % 10 == 0:
-                    print_stats()
+            if i < TOTAL_QUERIES - 1:
+                interval = source.next_interval()
+                stats["intervals"].record(interval)
+                if TRACE_MODE == "replay":
+                    # En lazo cerrado los offsets grabados ya incluyen el tiempo de
+                    # servicio: se espera hasta el instante grabado, no el intervalo completo
+                    interval = max(0.0, start + source.offset(i + 1) - time.perf_counter())
                 
-                if i < TOTAL_QUERIES - 1:
-                    if DISTRIBUTION_TYPE == "poisson":
-                        interval = generate_poisson_interval(LAMBDA)
-                    else:
-                        interval = generate_uniform_interval(MIN_INTERVAL, MAX_INTERVAL)
-                    
-                    stats["intervals"].append(interval)
-                    
+                if VERBOSE:
                     print(f"   ⏳ Esperando {interval*1000:.2f}ms...\n")
-                    time.sleep(interval)
-                
-            except Exception as e:
-                print(f"❌ Error en iteración {i + 1}: {e}\n")
-                stats["failed"] += 1
-                stats["total_sent"] += 1
+                time.sleep(interval)
         
         print("\n✅ Generación de tráfico completada")
         print_stats()
+        export_report()
         
     finally:
+        close_trace_writer(trace_writer)
+        conn.close()
+        print("🔌 Conexión cerrada")
+
+
+async def schedule_arrivals(loop, source, trace_writer, dispatch):
+    """
+    Calendario de llegadas de lazo abierto (modos open y pipeline): cada
+    llegada ocurre en su instante programado, independiente de cuánto tarden
+    las respuestas, y se entrega a dispatch(i, question).
+    """
+    # Hilo propio para precargar lotes de preguntas sin frenar el calendario
+    prefetch_executor = ThreadPoolExecutor(max_workers=1)
+    prefetch = None
+    start = loop.time()
+    next_arrival = start
+
+    try:
+        for i in range(TOTAL_QUERIES):
+            # max(1, ...): con FETCH_BATCH_SIZE=1 el umbral sería 0 y nunca se precargaría
+            if len(source) < max(1, FETCH_BATCH_SIZE // 2) and (prefetch is None or prefetch.done()):
+                prefetch = loop.run_in_executor(prefetch_executor, source.refill)
+            if len(source) == 0:
+                if prefetch is None:
+                    source.refill()
+                else:
+                    await prefetch
+
+            delay = next_arrival - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            stats["max_schedule_lag"] = max(stats["max_schedule_lag"], loop.time() - next_arrival)
+
+            # La pregunta se consume aunque la llegada se descarte, para que la
+            # traza grabada (o reproducida) conserve todas las llegadas
+            question = source.next_question()
+            if trace_writer:
+                trace_writer.write(next_arrival - start, question["id"])
+
+            await dispatch(i, question)
+
+            # El calendario avanza desde la llegada programada, no desde "ahora",
+            # así los retrasos del despachador no reducen la tasa efectiva
+            interval = source.next_interval()
+            stats["intervals"].record(interval)
+            next_arrival += interval
+    finally:
+        prefetch_executor.shutdown(wait=True)
+
+
+async def dispatch_query(loop, executor, semaphore, i, question, arrival):
+    """Tarea concurrente de una llegada: espera turno en el semáforo y ejecuta la consulta"""
+    async with semaphore:
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            # end_to_end incluye la espera por el semáforo (cola) desde la llegada
+            result = await loop.run_in_executor(executor, handle_query, question, arrival)
+            record_result(i, result)
+        except Exception as e:
+            record_failure(i, e)
+        finally:
+            stats["in_flight"] -= 1
+
+
+async def generate_traffic_open():
+    """
+    Generador de lazo abierto: las llegadas siguen el calendario exacto de la
+    distribución (independiente de cuánto tarden las respuestas) y cada una se
+    despacha como tarea concurrente, con un tope de MAX_IN_FLIGHT en vuelo.
+    """
+    print_header()
+
+    conn = connect_db()
+    print("✅ Conectado a la base de datos\n")
+    source = build_question_source(conn)
+    trace_writer = open_trace_writer()
+
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=MAX_IN_FLIGHT)
+    semaphore = asyncio.Semaphore(MAX_IN_FLIGHT)
+    tasks = set()
+
+    async def dispatch(i, question):
+        # tasks son las llegadas despachadas y aún no terminadas. No sirve
+        # semaphore.locked(): atrasado, el calendario crea tareas seguidas sin
+        # ceder el loop y ninguna alcanza a tomar el semáforo
+        if OVERLOAD_POLICY == "drop" and len(tasks) >= MAX_IN_FLIGHT:
+            stats["dropped"] += 1
+            return
+        arrival = time.perf_counter()
+        task = asyncio.create_task(dispatch_query(loop, executor, semaphore, i, question, arrival))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    stats["start_time"] = time.time()
+
+    try:
+        await schedule_arrivals(loop, source, trace_writer, dispatch)
+
+        if tasks:
+            await asyncio.gather(*tasks)
+
+        print("\n✅ Generación de tráfico completada")
+        print_stats()
+        export_report()
+
+    finally:
+        executor.shutdown(wait=True)
+        close_trace_writer(trace_writer)
+        conn.close()
+        print("🔌 Conexión cerrada")
+
+
+def llm_stage_lookup(item):
+    """Busca el elemento en el caché; retorna False si acertó y None si hay que consultar al LLM"""
+    cached, item["query_hash"], item["timings"]["cache_lookup"] = lookup_cached_answer(item["question"])
+    if cached:
+        # Acierto de caché: no hubo llamada al LLM y la etapa de score se salta
+        item["llm_answer"], item["quality_score"], item["cache"] = cached
+        return False
+    item["cache"] = "miss"
+    return None
+
+
+def llm_stage(item):
+    if llm_stage_lookup(item) is False:
+        return False
+    item["llm_answer"], item["llm_reused"] = query_llm(item["question"], item["timings"])
+
+
+def llm_batch_stage(items):
+    """
+    Etapa LLM por lotes: resuelve los aciertos de caché y manda el resto en una
+    sola solicitud. Retorna por elemento False (acierto), None (consultado) o
+    la excepción de su error.
+    """
+    misses = []
+    outcomes = []
+    for item in items:
+        outcomes.append(llm_stage_lookup(item))
+        if outcomes[-1] is None:
+            misses.append(item)
+
+    if misses:
+        answers = iter(query_llm_batch([item["question"] for item in misses]))
+        for position, item in enumerate(items):
+            if outcomes[position] is None:
+                answer = next(answers)
+                if isinstance(answer, Exception):
+                    outcomes[position] = answer
+                else:
+                    item["llm_answer"], item["llm_reused"] = answer
+    return outcomes
+
+
+def score_stage(item):
+    if item["cache"] != "miss":
+        return False
+    item["quality_score"] = calculate_score(item["llm_answer"], item["question"]["best_answer"], item["question"]["id"])
+    if answer_cache is not None:
+        answer_cache.put(item["question"]["id"], item["query_hash"], item["llm_answer"], item["quality_score"])
+
+
+def store_stage(item):
+    item["storage_result"] = store_result(item["question"], item["llm_answer"], item["quality_score"])
+
+
+def finish_pipeline_item(item):
+    """Registra una consulta que completó las tres etapas del pipeline"""
+    timings = item["timings"]
+    timings["end_to_end"] = time.perf_counter() - item["arrival"]
+    if answer_cache is None:
+        del timings["cache_lookup"]
+    record_result(item["i"], {
+        "question": item["question"],
+        "llm_answer": item["llm_answer"],
+        "query_time": timings.get("llm", 0.0),
+        "quality_score": item["quality_score"],
+        "storage_result": item["storage_result"],
+        "cache": item["cache"],
+        "llm_reused": item.get("llm_reused", False),
+        "timings": timings
+    })
+
+
+async def stage_worker(loop, name, executor, in_queue, out_queue, work):
+    """
+    Worker de una etapa del pipeline: toma elementos de su cola, ejecuta la
+    llamada bloqueante en el executor de la etapa y pasa el elemento a la
+    siguiente cola (o lo registra si es la última etapa).
+    """
+    while True:
+        item = await in_queue.get()
+        try:
+            started = time.perf_counter()
+            stats["latency"][f"wait_{name}"].record(started - item["enqueued"])
+            try:
+                ran = await loop.run_in_executor(executor, work, item)
+            except Exception as e:
+                stats["in_flight"] -= 1
+                record_failure(item["i"], e)
+                continue
+
+            # Una etapa que se saltó (acierto de caché) no cuenta en su histograma
+            if ran is not False:
+                item["timings"][name] = time.perf_counter() - started
+            if out_queue is None:
+                stats["in_flight"] -= 1
+                finish_pipeline_item(item)
+            else:
+                item["enqueued"] = time.perf_counter()
+                await out_queue.put(item)
+        finally:
+            in_queue.task_done()
+
+
+async def llm_batch_worker(loop, executor, in_queue, out_queue):
+    """
+    Worker de la etapa LLM con LLM_BATCH_SIZE > 1: toma un elemento y, sin
+    esperar, los que ya estén en la cola hasta completar el lote; los manda
+    juntos a /ask/batch y falla solo los elementos que vuelven con error.
+    """
+    while True:
+        items = [await in_queue.get()]
+        while len(items) < LLM_BATCH_SIZE and not in_queue.empty():
+            items.append(in_queue.get_nowait())
+        try:
+            started = time.perf_counter()
+            for item in items:
+                stats["latency"]["wait_llm"].record(started - item["enqueued"])
+            try:
+                outcomes = await loop.run_in_executor(executor, llm_batch_stage, items)
+            except Exception as e:
+                outcomes = [e] * len(items)
+            elapsed = time.perf_counter() - started
+
+            for item, outcome in zip(items, outcomes):
+                if isinstance(outcome, Exception):
+                    stats["in_flight"] -= 1
+                    record_failure(item["i"], outcome)
+                    continue
+                if outcome is not False:
+                    item["timings"]["llm"] = elapsed
+                item["enqueued"] = time.perf_counter()
+                await out_queue.put(item)
+        finally:
+            for _ in items:
+                in_queue.task_done()
+
+
+async def sample_queue_depths(queues):
+    """Muestrea periódicamente la profundidad de cada cola del pipeline"""
+    while True:
+        for name, queue in queues.items():
+            depth = stats["queue_depth"][name]
+            current = queue.qsize()
+            depth["current"] = current
+            depth["max"] = max(depth["max"], current)
+            depth["sum"] += current
+            depth["samples"] += 1
+        await asyncio.sleep(QUEUE_SAMPLE_INTERVAL)
+
+
+async def generate_traffic_pipeline():
+    """
+    Generador de lazo abierto con etapas LLM -> score -> store. Cada etapa
+    tiene su propia concurrencia y sesión HTTP keep-alive, y entre etapas hay
+    colas acotadas (STAGE_QUEUE_SIZE): una etapa lenta se ve como una cola
+    que crece, no como throughput perdido.
+    """
+    print_header()
+
+    conn = connect_db()
+    print("✅ Conectado a la base de datos\n")
+    source = build_question_source(conn)
+    trace_writer = open_trace_writer()
+
+    loop = asyncio.get_running_loop()
+    concurrency = {"llm": LLM_CONCURRENCY, "score": SCORE_CONCURRENCY, "store": STORE_CONCURRENCY}
+    work = {"llm": llm_stage, "score": score_stage, "store": store_stage}
+    queues = {name: asyncio.Queue(maxsize=STAGE_QUEUE_SIZE) for name in PIPELINE_STAGES}
+    executors = {name: ThreadPoolExecutor(max_workers=concurrency[name]) for name in PIPELINE_STAGES}
+
+    workers = []
+    for position, name in enumerate(PIPELINE_STAGES):
+        out_queue = queues[PIPELINE_STAGES[position + 1]] if position + 1 < len(PIPELINE_STAGES) else None
+        for _ in range(concurrency[name]):
+            if name == "llm" and LLM_BATCH_SIZE > 1:
+                worker = llm_batch_worker(loop, executors[name], queues[name], out_queue)
+            else:
+                worker = stage_worker(loop, name, executors[name], queues[name], out_queue, work[name])
+            workers.append(asyncio.create_task(worker))
+    workers.append(asyncio.create_task(sample_queue_depths(queues)))
+
+    async def dispatch(i, question):
+        if OVERLOAD_POLICY == "drop" and queues["llm"].full():
+            stats["dropped"] += 1
+            return
+        now = time.perf_counter()
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        # Con política "queue" una cola llena frena al despachador (se ve como retraso del calendario)
+        await queues["llm"].put({"i": i, "question": question, "arrival": now, "enqueued": now, "timings": {}})
+
+    stats["start_time"] = time.time()
+
+    try:
+        await schedule_arrivals(loop, source, trace_writer, dispatch)
+
+        for name in PIPELINE_STAGES:
+            await queues[name].join()
+
+        print("\n✅ Generación de tráfico completada")
+        print_stats()
+        export_report()
+
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        for executor in executors.values():
+            executor.shutdown(wait=True)
+        close_trace_writer(trace_writer)
         conn.close()
         print("🔌 Conexión cerrada")
 
 
+def warm_up_llm_cache():
+    """
+    Precalienta el caché del servicio LLM: muestrea WARMUP_QUESTIONS preguntas
+    con el mismo SAMPLER y semilla que la corrida (así caen las populares) y
+    manda las distintas en lotes de WARMUP_BATCH_SIZE a /ask/batch.
+    """
+    conn = connect_db()
+    try:
+        source = build_question_source(conn)
+        questions = {}
+        for _ in range(WARMUP_QUESTIONS):
+            question = source.next_question()
+            questions[question["id"]] = question
+    finally:
+        conn.close()
+
+    unique = list(questions.values())
+    print(f"🔥 Precalentando caché del LLM con {len(unique)} preguntas distintas "
+          f"(lotes de {WARMUP_BATCH_SIZE})")
+    start = time.time()
+    answered = failed = 0
+    for offset in range(0, len(unique), WARMUP_BATCH_SIZE):
+        try:
+            answers = query_llm_batch(unique[offset:offset + WARMUP_BATCH_SIZE])
+        except Exception as e:
+            print(f"❌ Error en lote de precalentamiento: {e}")
+            failed += len(unique[offset:offset + WARMUP_BATCH_SIZE])
+            continue
+        errors = sum(isinstance(answer, Exception) for answer in answers)
+        answered += len(answers) - errors
+        failed += errors
+    print(f"✅ Precalentamiento listo en {time.time() - start:.2f}s: {answered} respuestas, {failed} errores")
+
+
+def run_generator():
+    """Ejecuta el generador en el modo configurado"""
+    if SEED is not None:
+        random.seed(SEED)
+
+    if LOOP_MODE == "open":
+        asyncio.run(generate_traffic_open())
+    elif LOOP_MODE == "pipeline":
+        asyncio.run(generate_traffic_pipeline())
+    else:
+        generate_traffic()
+
+
+def take_share(shares, index, seed, popularity_seed):
+    """
+    Ajusta la configuración global para generar 1/shares de la carga:
+    divide la tasa y el total de consultas y fija la semilla propia y la
+    del ranking de popularidad (común a todos).
+    """
+    global LAMBDA, MIN_INTERVAL, MAX_INTERVAL, TOTAL_QUERIES, SEED, POPULARITY_SEED
+
+    LAMBDA = LAMBDA / shares
+    MIN_INTERVAL = MIN_INTERVAL * shares
+    MAX_INTERVAL = MAX_INTERVAL * shares
+    TOTAL_QUERIES = TOTAL_QUERIES // shares + (1 if index < TOTAL_QUERIES % shares else 0)
+    SEED = seed
+    POPULARITY_SEED = popularity_seed
+
+
+def run_worker(index, base_seed, popularity_seed, result_queue):
+    """Proceso worker: genera su parte de la carga y devuelve su reporte al coordinador"""
+    global REPORT_PATH, TRACE_PATH
+
+    take_share(WORKERS, index, base_seed + index, popularity_seed)
+    REPORT_PATH = ""  # el coordinador exporta el reporte combinado
+    # Cada worker graba/reproduce su propia traza (mismo WORKERS al grabar y reproducir)
+    root, extension = os.path.splitext(TRACE_PATH)
+    TRACE_PATH = f"{root}_{index}{extension}"
+    try:
+        run_generator()
+        result_queue.put((index, build_report(), None))
+    except Exception as e:
+        result_queue.put((index, None, str(e)))
+
+
+def run_coordinator():
+    """
+    Lanza WORKERS procesos, cada uno con 1/WORKERS de la tasa y su propia
+    semilla, y combina sus histogramas y contadores en un solo reporte.
+    """
+    base_seed = SEED if SEED is not None else random.randrange(2 ** 31)
+    popularity_seed = POPULARITY_SEED if POPULARITY_SEED is not None else base_seed
+    print(f"🧩 Coordinador: {WORKERS} workers (semilla base: {base_seed})")
+
+    # fork: los workers heredan la configuración ya ajustada (p. ej. por REPLICAS)
+    context = multiprocessing.get_context("fork")
+    result_queue = context.Queue()
+    processes = [
+        context.Process(target=run_worker, args=(index, base_seed, popularity_seed, result_queue))
+        for index in range(WORKERS)
+    ]
+
+    stats["start_time"] = time.time()
+    for process in processes:
+        process.start()
+
+    # Leer la cola antes de join para no bloquear a workers con reportes grandes
+    for _ in processes:
+        index, report, error = result_queue.get()
+        if error:
+            print(f"❌ Worker {index} falló: {error}")
+        else:
+            merge_report_into_stats(report)
+            print(f"✅ Worker {index} terminó ({report['counters']['total_sent']} consultas)")
+
+    for process in processes:
+        process.join()
+
+    print("\n✅ Generación distribuida completada")
+    print_stats()
+    export_report()
+
+
+def merge_report_files(patterns):
+    """
+    Combina reportes JSON de varias réplicas (un contenedor por REPLICA_INDEX)
+    en REPORT_PATH. Los patrones se expanden acá: docker compose run no pasa
+    el comando por una shell que los expanda.
+    """
+    paths = sorted({path for pattern in patterns for path in glob.glob(pattern)})
+    if not paths:
+        print(f"❌ Ningún reporte coincide con: {' '.join(patterns)}")
+        sys.exit(1)
+
+    elapsed = 0.0
+    for path in paths:
+        with open(path) as f:
+            report = json.load(f)
+        merge_report_into_stats(report)
+        elapsed = max(elapsed, report["elapsed_s"])
+        print(f"📥 {path}: {report['counters']['total_sent']} consultas")
+
+    stats["start_time"] = time.time() - elapsed
+    print_stats()
+    export_report()
+
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "merge":
+        # python traffic_generator.py merge 'reports/poisson_report_*.json' (el patrón lo expande el script)
+        merge_report_files(sys.argv[2:])
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "warmup":
+        # python traffic_generator.py warmup (usa SAMPLER, SEED y WARMUP_*)
+        warm_up_llm_cache()
+        sys.exit(0)
+
     try:
         print("⏳ Esperando que los servicios estén listos...")
         time.sleep(1)
-        
-        generate_traffic()
+
+        if REPLICAS > 1:
+            # Réplica de docker compose: se toma la parte de este contenedor y
+            # cada una escribe su reporte aparte para combinarlo después.
+            # REPLICA_INDEX y SEED son obligatorios: con índices repetidos o sin
+            # semilla común las réplicas repetirían flujos aleatorios o armarían
+            # rankings de popularidad distintos.
+            replica_env = os.getenv("REPLICA_INDEX", "")
+            if not replica_env or SEED is None:
+                print("❌ Con REPLICAS > 1 se deben fijar REPLICA_INDEX (0..REPLICAS-1) y SEED")
+                sys.exit(1)
+            replica = int(replica_env)
+            if not 0 <= replica < REPLICAS:
+                print(f"❌ REPLICA_INDEX debe estar entre 0 y {REPLICAS - 1}")
+                sys.exit(1)
+            # Cada réplica usa las semillas SEED + replica*WORKERS .. + WORKERS - 1, sin solaparse
+            take_share(REPLICAS, replica, SEED + replica * WORKERS, SEED)
+            if REPORT_PATH:
+                root, extension = os.path.splitext(REPORT_PATH)
+                REPORT_PATH = f"{root}_{replica}{extension}"
+
+        if WORKERS > 1:
+            run_coordinator()
+        else:
+            run_generator()
         
     except KeyboardInterrupt:
         print("\n⚠️  Generación interrumpida por el usuario")
         print_stats()
+        export_report()
     except Exception as e:
         print(f"💥 Error fatal: {e}")
         import traceback
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
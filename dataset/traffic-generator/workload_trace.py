@@ -0,0 +1,39 @@
+import json
+
+
+class TraceWriter:
+    """
+    Graba una traza de carga en NDJSON: una línea de cabecera con la
+    configuración y luego una línea {"t": offset_s, "q": question_id} por llegada.
+    """
+
+    def __init__(self, path, config=None):
+        self.path = path
+        self.file = open(path, "w")
+        self.count = 0
+        self.file.write(json.dumps({"trace": 1, "config": config or {}}) + "\n")
+
+    def write(self, offset_seconds, question_id):
+        self.file.write(json.dumps({"t": round(offset_seconds, 6), "q": int(question_id)},
+                                   separators=(",", ":")) + "\n")
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+
+def load_trace(path):
+    """Lee una traza grabada y retorna la lista de (offset_s, question_id) ordenada por tiempo"""
+    entries = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if "trace" in record:
+                continue
+            entries.append((float(record["t"]), int(record["q"])))
+
+    entries.sort(key=lambda entry: entry[0])
+    return entries